@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'core',
@@ -46,11 +47,14 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'core.middleware.InstrumentationMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -86,9 +90,57 @@ DATABASES = {
         'NAME': os.environ.get('DB_USER'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        # seconds a connection is reused for, 0 closes it after each request
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
     }
 }
 
+# With DB_POOL_MAX_SIZE set, the connections come from a bounded pool per
+# worker process instead, and go back to it at the end of each request
+if int(os.environ.get('DB_POOL_MAX_SIZE', 0)):
+    DATABASES['default'].update({
+        'ENGINE': 'core.db',
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'max_size': int(os.environ['DB_POOL_MAX_SIZE']),
+            # seconds a request waits for a connection when all are in use
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            # connections idle for longer are checked with SELECT 1
+            'check_interval': float(
+                os.environ.get('DB_POOL_CHECK_INTERVAL', 30)),
+        },
+    })
+
+
+# Read replicas of the primary, as a comma separated list of hosts. The
+# safe requests read from one of them, unless the client wrote recently.
+for index, host in enumerate(
+        filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))):
+    DATABASES[f'replica{index + 1}'] = dict(
+        DATABASES['default'], HOST=host.strip(), TEST={'MIRROR': 'default'})
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+# seconds a client reads from the primary after a write, kept in a cache
+# shared by every process (ReplicaMiddleware refuses a local memory one),
+# by default files in REPLICA_PIN_CACHE_LOCATION
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+REPLICA_PIN_CACHE = 'default'
+if os.environ.get('REPLICA_PIN_CACHE_LOCATION'):
+    CACHES['replica-pins'] = {
+        'BACKEND': os.environ.get(
+            'REPLICA_PIN_CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ['REPLICA_PIN_CACHE_LOCATION'],
+    }
+    REPLICA_PIN_CACHE = 'replica-pins'
+# seconds an unreachable replica is left out
+REPLICA_RETRY_SECONDS = int(os.environ.get('REPLICA_RETRY_SECONDS', 30))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -131,6 +183,73 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Who sends the media files: 'file' streams them from Django,
+# 'x-accel-redirect' (nginx) and 'x-sendfile' (Apache, lighttpd) hand them
+# to the front server. Left empty, they are only served with DEBUG.
+MEDIA_SERVE = os.environ.get('MEDIA_SERVE', '')
+# internal nginx location aliasing MEDIA_ROOT
+MEDIA_ACCEL_REDIRECT_LOCATION = os.environ.get(
+    'MEDIA_ACCEL_REDIRECT_LOCATION', '/protected-media/')
+
+# Processes resizing the uploaded images, 0 resizes them in the request
+IMAGE_VARIANT_WORKERS = int(os.environ.get('IMAGE_VARIANT_WORKERS', 2))
+
+# Partial files of the resumable image uploads, outside of MEDIA_ROOT
+IMAGE_UPLOAD_DIR = os.environ.get('IMAGE_UPLOAD_DIR', '/vol/web/uploads')
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.environ.get('IMAGE_UPLOAD_MAX_SIZE', 20 * 1024 * 1024))
+
+# Seconds a SELECT 1 may take before /healthz and /readyz report failure
+HEALTH_DB_LATENCY_LIMIT = float(
+    os.environ.get('HEALTH_DB_LATENCY_LIMIT', 0.5))
+
+# Request profiling, left out of the middleware when disabled. A staff user
+# profiles a request with the X-Profile header, PROFILING_SAMPLE_RATE is the
+# fraction of all the requests profiled at random.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '') == '1'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+# seconds between two samples of the stack
+PROFILING_INTERVAL = float(os.environ.get('PROFILING_INTERVAL', 0.005))
+PROFILING_DIR = os.environ.get('PROFILING_DIR', '/vol/web/profiles')
+
 # --------------------------------------------------------------------------
 # The user is provided by the class User in the module core
 AUTH_USER_MODEL = 'core.User'
+
+# --------------------------------------------------------------------------
+# Users of the recently seen API tokens, kept in the memory of each process.
+# A deleted token or a deactivated user is only forgotten by the process
+# that made the change, the others accept it for up to the timeout (in
+# seconds): keep it short, or 0 to always check the database
+TOKEN_CACHE = {
+    'max_entries': int(os.environ.get('TOKEN_CACHE_MAX_ENTRIES', 4096)),
+    'timeout': int(os.environ.get('TOKEN_CACHE_TIMEOUT', 30)),
+}
+
+# --------------------------------------------------------------------------
+# Token buckets of the throttled APIs: burst size and refill per minute,
+# kept in one of the CACHES (a shared one throttles across processes)
+THROTTLE_CACHE = 'default'
+THROTTLE_BUCKETS = {
+    'auth': {'capacity': 10, 'per_minute': 5},
+    'read': {'capacity': 300, 'per_minute': 600},
+    'write': {'capacity': 60, 'per_minute': 120},
+}
+# multiplies the capacity and the rate of every bucket, raised for load tests
+THROTTLE_SCALE = float(os.environ.get('THROTTLE_SCALE', 1))
+# Proxies in front of the app whose X-Forwarded-For is trusted to identify
+# the client, with none a client could pick its own throttling bucket
+REST_FRAMEWORK = {
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+}
+# Password checks a process runs at once, the others get a 503
+AUTH_MAX_CONCURRENCY = int(os.environ.get('AUTH_MAX_CONCURRENCY', 2))
+
+# --------------------------------------------------------------------------
+# Cache of the list responses, keyed by user and data version
+RESPONSE_CACHE = {
+    'BACKEND': 'core.cache.LocalMemoryResponseCache',
+    'OPTIONS': {
+        'max_entries': int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1024)),
+    },
+}
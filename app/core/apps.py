@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        # connect the signal handlers
+        from core import signals  # noqa
+        from core.instrumentation import instrument_serializers
+        instrument_serializers()
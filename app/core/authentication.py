@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class TokenCache:
+    """Least recently used tokens, forgotten after a timeout"""
+
+    def __init__(self, max_entries=4096, timeout=60):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the entry of the token or None"""
+        with self._lock:
+            try:
+                expires, entry = self._data[key]
+            except KeyError:
+                return None
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, entry)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_user(self, user_id):
+        """Forget every token of the user"""
+        with self._lock:
+            for key in [key for key, (_, entry) in self._data.items()
+                        if entry['user_id'] == user_id]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_token_cache = None
+
+
+def get_token_cache():
+    """Return the token cache configured in TOKEN_CACHE"""
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = TokenCache(**settings.TOKEN_CACHE)
+    return _token_cache
+
+
+@receiver(setting_changed)
+def reset_token_cache(setting, **kwargs):
+    global _token_cache
+    if setting == 'TOKEN_CACHE':
+        _token_cache = None
+
+
+def _user_fields():
+    # the data version changes on every write, it is loaded when used
+    return [field.attname for field in get_user_model()._meta.concrete_fields
+            if field.attname != 'data_version']
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication remembering the users of the recent tokens
+
+    A cache hit builds the user and the token again from the cached
+    values, so no request shares the instances of another one.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        entry = cache.get(key)
+        if entry is None:
+            user, token = super().authenticate_credentials(key)
+            fields = _user_fields()
+            cache.set(key, {
+                'user_id': user.pk,
+                'created': token.created,
+                'values': [getattr(user, field) for field in fields],
+            })
+            return user, token
+
+        user = get_user_model().from_db(
+            DEFAULT_DB_ALIAS, _user_fields(), entry['values'])
+        token = Token(key=key, user=user, created=entry['created'])
+        token._state.adding = False
+        return user, token
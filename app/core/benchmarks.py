@@ -0,0 +1,140 @@
+import http.client
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+
+def percentile(values, percent):
+    """Return the nearest rank percentile of sorted values"""
+    if not values:
+        return None
+    rank = max(math.ceil(percent / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def summarize(durations, errors=0, elapsed=None):
+    """Return the throughput and latency percentiles, in milliseconds"""
+    durations = sorted(duration * 1000 for duration in durations)
+    summary = {
+        'count': len(durations),
+        'errors': errors,
+        'mean': round(sum(durations) / len(durations), 3)
+        if durations else None,
+    }
+    for percent in (50, 95, 99):
+        value = percentile(durations, percent)
+        summary[f'p{percent}'] = round(value, 3) if value is not None \
+            else None
+    if elapsed:
+        summary['throughput'] = round(len(durations) / elapsed, 1)
+    return summary
+
+
+class HttpClient:
+    """HTTP client keeping one connection to the server per thread"""
+
+    def __init__(self, base_url, token=None):
+        url = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection \
+            if url.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = url.netloc
+        self.prefix = url.path.rstrip('/')
+        self.token = token
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        """Return the status and the body of the response"""
+        headers = dict(headers or {})
+        if self.token:
+            headers['Authorization'] = f'Token {self.token}'
+        if isinstance(body, dict):
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = \
+                self.connection_class(self.netloc, timeout=30)
+        try:
+            connection.request(method, self.prefix + path, body, headers)
+            response = connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self._local.connection = None
+            raise
+
+    def get_json(self, path):
+        status, body = self.request('GET', path)
+        if status != 200:
+            raise http.client.HTTPException(f'GET {path} returned {status}')
+        return json.loads(body)
+
+
+def run_load(send, count, concurrency):
+    """Send `count` requests from `concurrency` threads and summarize them
+
+    `send(number)` sends one request and returns its status, anything
+    but a 2xx is counted as an error and left out of the latencies.
+    """
+    def timed(number):
+        started = time.perf_counter()
+        try:
+            status = send(number)
+        except (OSError, http.client.HTTPException):
+            status = None
+        return status, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(timed, range(count)))
+    elapsed = time.perf_counter() - started
+    durations = [duration for status, duration in results
+                 if status is not None and 200 <= status < 300]
+    summary = summarize(durations, len(results) - len(durations), elapsed)
+    summary['statuses'] = {}
+    for status, _ in results:
+        summary['statuses'][str(status)] = \
+            summary['statuses'].get(str(status), 0) + 1
+    return summary
+
+
+def time_calls(func, repeat):
+    """Call a function `repeat` times and summarize the durations"""
+    func()  # warm up
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return summarize(durations)
+
+
+def compare(baseline, results, threshold):
+    """Return the regressions of results over baseline beyond threshold %
+
+    A benchmark regresses when its p95 latency grows or its throughput
+    falls by more than the threshold.
+    """
+    regressions = []
+    for group in ('http', 'micro'):
+        for name, current in results.get(group, {}).items():
+            previous = baseline.get(group, {}).get(name)
+            if not previous:
+                continue
+            if previous.get('p95') and current.get('p95') is not None:
+                change = (current['p95'] / previous['p95'] - 1) * 100
+                if change > threshold:
+                    regressions.append(
+                        f'{name}: p95 {previous["p95"]} -> '
+                        f'{current["p95"]} ms (+{change:.1f}%)')
+            if previous.get('throughput') and 'throughput' in current:
+                change = (1 - current['throughput'] /
+                          previous['throughput']) * 100
+                if change > threshold:
+                    regressions.append(
+                        f'{name}: throughput {previous["throughput"]} -> '
+                        f'{current["throughput"]} req/s (-{change:.1f}%)')
+    return regressions
@@ -0,0 +1,139 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+class BaseResponseCache:
+    """Interface of the response cache backends"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the value stored for the key or None"""
+        value = self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Store the value for the key"""
+        raise NotImplementedError
+
+    def clear(self):
+        """Remove every value and reset the counters"""
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """Return the hit and miss counters"""
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def _get(self, key):
+        raise NotImplementedError
+
+
+class LocalMemoryResponseCache(BaseResponseCache):
+    """Least recently used cache in the memory of the process"""
+
+    def __init__(self, max_entries=1024):
+        super().__init__()
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        super().clear()
+
+    def stats(self):
+        stats = super().stats()
+        stats['entries'] = len(self._data)
+        return stats
+
+
+class DjangoResponseCache(BaseResponseCache):
+    """Cache stored in one of the CACHES configured in the settings
+
+    Use it with a shared cache (memcached, redis) to share the responses
+    between all the worker processes.
+    """
+
+    def __init__(self, alias='default', timeout=None):
+        super().__init__()
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def _get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.timeout)
+
+    def clear(self):
+        self.cache.clear()
+        super().clear()
+
+
+_response_cache = None
+
+
+def get_response_cache():
+    """Return the response cache configured in RESPONSE_CACHE"""
+    global _response_cache
+    if _response_cache is None:
+        config = settings.RESPONSE_CACHE
+        backend = import_string(config['BACKEND'])
+        _response_cache = backend(**config.get('OPTIONS', {}))
+    return _response_cache
+
+
+@receiver(setting_changed)
+def reset_response_cache(setting, **kwargs):
+    global _response_cache
+    if setting == 'RESPONSE_CACHE':
+        _response_cache = None
+
+
+def response_cache_key(request):
+    """Return the cache key of a response to the request
+
+    The key holds the data version of the user, so bumping the version
+    makes every response cached for the user unreachable at once.
+    """
+    user = request.user
+    url = request.build_absolute_uri().encode('utf-8')
+    digest = hashlib.md5(url).hexdigest()
+    return f'response:{user.pk}:{user.data_version}:{digest}'
+
+
+def bump_data_version(user):
+    """Invalidate the responses cached for the user"""
+    type(user).objects.filter(pk=user.pk).update(
+        data_version=F('data_version') + 1)
+    user.data_version += 1
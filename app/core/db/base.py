@@ -0,0 +1,43 @@
+from django.db.backends.postgresql import base, creation
+from core.db.pool import close_pools, get_pool
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # the idle pooled connections would keep the database in use
+        close_pools(database=test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend taking its connections from a pool
+
+    Closing the connection, at the end of every request when CONN_MAX_AGE
+    is 0, gives it back to the pool. The pool is configured by the POOL
+    entry of the database settings.
+    """
+    creation_class = DatabaseCreation
+
+    def get_new_connection(self, conn_params):
+        self._pool = get_pool(
+            self.alias, conn_params,
+            lambda: base.Database.connect(**conn_params),
+            **self.settings_dict.get('POOL', {}))
+        connection = self._pool.checkout()
+
+        # as in the PostgreSQL backend, for new and reused connections
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self._pool.checkin(self.connection)
@@ -0,0 +1,38 @@
+import io
+import json
+from decimal import Decimal
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def _copy_escape(value):
+    if isinstance(value, (int, Decimal)):
+        # most of the values, they need no escaping
+        return str(value)
+    if value is None:
+        return '\\N'
+    if isinstance(value, dict):
+        value = json.dumps(value)
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t') \
+        .replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_rows(table, columns, rows, using=DEFAULT_DB_ALIAS):
+    """Load the rows into the table with COPY FROM STDIN (PostgreSQL)"""
+    data = io.StringIO()
+    for row in rows:
+        data.write('\t'.join(_copy_escape(value) for value in row))
+        data.write('\n')
+    data.seek(0)
+    with connections[using].cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {table} ({", ".join(columns)}) FROM STDIN', data)
+
+
+def reserve_ids(model, count, using=DEFAULT_DB_ALIAS):
+    """Return the next `count` values of the id sequence of the model"""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+            "FROM generate_series(1, %s)",
+            [model._meta.db_table, count])
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,158 @@
+import threading
+import time
+import psycopg2
+from psycopg2 import extensions
+from django.db.utils import OperationalError
+
+
+class ConnectionPool:
+    """Bounded pool of the connections to one database in this process
+
+    A connection idle for longer than `check_interval` seconds is checked
+    with SELECT 1 before it is handed out again. When every connection is
+    in use, a checkout waits up to `timeout` seconds for one.
+    """
+
+    def __init__(self, connect, max_size=10, timeout=10, check_interval=30):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = []
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.created = 0
+        self.discarded = 0
+        self.checkouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def checkout(self):
+        """Return a healthy connection, opening one if none is idle"""
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise OperationalError(
+                f'No database connection available in {self.timeout}s')
+        waited = time.monotonic() - started
+        try:
+            connection = self._take_idle()
+            if connection is None:
+                connection = self.connect()
+                with self._lock:
+                    self.created += 1
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.wait_time += waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+        return connection
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                # the most recently used is the most likely to be alive
+                connection, returned = self._idle.pop()
+            if self._is_healthy(connection, returned):
+                return connection
+            self._discard(connection)
+
+    def _is_healthy(self, connection, returned):
+        if connection.closed:
+            return False
+        if time.monotonic() - returned < self.check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def checkin(self, connection):
+        """Give back a connection, rolling back what it left open"""
+        try:
+            if not connection.closed:
+                status = connection.get_transaction_status()
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    connection.close()
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+        except psycopg2.Error:
+            connection.close()
+        with self._lock:
+            self.in_use -= 1
+            if connection.closed:
+                self.discarded += 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+        self._slots.release()
+
+    def _discard(self, connection):
+        with self._lock:
+            self.discarded += 1
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def close(self):
+        """Close the idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'in_use': self.in_use,
+                'idle': len(self._idle),
+                'created': self.created,
+                'discarded': self.discarded,
+                'checkouts': self.checkouts,
+                'wait_time': self.wait_time,
+                'max_wait_time': self.max_wait_time,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, conn_params, connect, **options):
+    """Return the pool of the connections with these parameters"""
+    key = (alias, tuple(sorted(
+        (name, str(value)) for name, value in conn_params.items())))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(connect, **options)
+        return _pools[key]
+
+
+def close_pools(database=None):
+    """Close the idle connections of every pool, or of one database"""
+    with _pools_lock:
+        pools = list(_pools.items())
+    for (_, params), pool in pools:
+        if database is None or ('database', database) in params:
+            pool.close()
+
+
+def pool_stats():
+    """Return the statistics of the pools, by database alias"""
+    with _pools_lock:
+        pools = list(_pools.items())
+    stats = {}
+    for (alias, params), pool in pools:
+        stats.setdefault(alias, []).append(
+            dict(pool.stats(), database=dict(params).get('database')))
+    return stats
@@ -0,0 +1,62 @@
+import random
+import threading
+import time
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import OperationalError
+
+
+_state = threading.local()
+_down_until = {}
+
+
+def get_read_database():
+    """Return the replica chosen for the current request, if any"""
+    return getattr(_state, 'read_database', None)
+
+
+def set_read_database(alias):
+    _state.read_database = alias
+
+
+def mark_down(alias):
+    """Skip a replica for REPLICA_RETRY_SECONDS"""
+    _down_until[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+    connections[alias].close()
+
+
+def choose_replica():
+    """Return a reachable replica, or None when the primary must be used"""
+    replicas = list(settings.REPLICA_DATABASES)
+    random.shuffle(replicas)
+    now = time.monotonic()
+    for alias in replicas:
+        if _down_until.get(alias, 0) > now:
+            continue
+        try:
+            connections[alias].ensure_connection()
+        except OperationalError:
+            mark_down(alias)
+            continue
+        return alias
+    return None
+
+
+class ReplicaRouter:
+    """Send the reads of the requests ReplicaMiddleware marked to a replica
+
+    Every write, and every read outside of those requests, goes to the
+    primary. The replicas mirror the primary, they are never migrated.
+    """
+
+    def db_for_read(self, model, **hints):
+        return get_read_database()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,32 @@
+import time
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+
+_migrated = set()
+
+
+def database_latency(alias=DEFAULT_DB_ALIAS):
+    """Run SELECT 1 on the database, return how long it took in seconds"""
+    started = time.monotonic()
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+    return time.monotonic() - started
+
+
+def pending_migrations(alias=DEFAULT_DB_ALIAS):
+    """Return the migrations not applied to the database yet
+
+    Loading the migrations reads every migration file, so once they are
+    all applied the answer is remembered for the life of the process.
+    """
+    if alias in _migrated:
+        return []
+    executor = MigrationExecutor(connections[alias])
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    pending = [f'{migration.app_label}.{migration.name}'
+               for migration, _ in plan]
+    if not pending:
+        _migrated.add(alias)
+    return pending
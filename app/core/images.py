@@ -0,0 +1,123 @@
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from PIL import Image
+from core.models import ImageFile, Recipe, User
+
+
+# name: (bounding box, Pillow format, file extension)
+IMAGE_VARIANTS = {
+    'thumbnail': ((150, 150), 'JPEG', 'jpg'),
+    'medium': ((600, 600), 'JPEG', 'jpg'),
+    'webp': ((600, 600), 'WEBP', 'webp'),
+}
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def variant_name(image_name, variant):
+    """Return the storage name of a variant of an image"""
+    directory, filename = os.path.split(image_name)
+    stem = os.path.splitext(filename)[0]
+    ext = IMAGE_VARIANTS[variant][2]
+    return os.path.join(directory, 'variants', f'{stem}_{variant}.{ext}')
+
+
+def build_variants(media_root, image_name):
+    """Write the resized variants of an image, return their names
+
+    This runs in a worker process, so it only touches the file system.
+    """
+    names = {}
+    with Image.open(os.path.join(media_root, image_name)) as original:
+        original.load()
+        for variant, (size, image_format, _) in IMAGE_VARIANTS.items():
+            image = original.copy()
+            image.thumbnail(size, Image.LANCZOS)
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            name = variant_name(image_name, variant)
+            path = os.path.join(media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                image.save(path, image_format, quality=85)
+            except (KeyError, OSError):
+                # Pillow was built without support for the format
+                continue
+            names[variant] = name
+    return names
+
+
+def get_executor():
+    """Return the process pool shared by the requests of this process"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS)
+        return _executor
+
+
+def save_variants(recipe_id, image_name, names):
+    """Record the variants, unless the image was replaced meanwhile"""
+    updated = Recipe.objects.filter(id=recipe_id, image=image_name).update(
+        image_variants=names, version=F('version') + 1)
+    if updated:
+        # the cached responses and the ETags of the owner are outdated
+        User.objects.filter(recipe__id=recipe_id).update(
+            data_version=F('data_version') + 1)
+
+
+def schedule_variants(recipe):
+    """Build the variants of the recipe image outside the request
+
+    With IMAGE_VARIANT_WORKERS set to 0 they are built synchronously.
+    """
+    if not recipe.image:
+        # the image was cleared, there is nothing to resize
+        return
+    recipe_id, image_name = recipe.id, recipe.image.name
+    if not settings.IMAGE_VARIANT_WORKERS:
+        recipe.image_variants = build_variants(settings.MEDIA_ROOT, image_name)
+        save_variants(recipe_id, image_name, recipe.image_variants)
+        return
+
+    def done(future):
+        # called in a thread of this process, which owns a connection
+        try:
+            if future.exception() is None:
+                save_variants(recipe_id, image_name, future.result())
+            else:
+                logger.error('Could not build the variants of %s',
+                             image_name, exc_info=future.exception())
+        finally:
+            connection.close()
+
+    get_executor().submit(
+        build_variants, settings.MEDIA_ROOT, image_name
+    ).add_done_callback(done)
+
+
+def delete_image_files(name):
+    """Delete an image and its variants, unless it is referenced again"""
+    storage = Recipe._meta.get_field('image').storage
+    with transaction.atomic():
+        ImageFile.objects.lock(name)
+        if ImageFile.objects.filter(name=name).exists():
+            return
+        storage.delete(name)
+        for variant in IMAGE_VARIANTS:
+            storage.delete(variant_name(name, variant))
+
+
+def release_image(name):
+    """Drop a reference to an image, its files go with the last one"""
+    if ImageFile.objects.release(name):
+        transaction.on_commit(lambda: delete_image_files(name))
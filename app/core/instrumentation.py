@@ -0,0 +1,154 @@
+import bisect
+import threading
+import time
+from rest_framework.serializers import BaseSerializer
+
+
+# upper bounds of the histogram buckets, the times are in milliseconds
+BUCKETS = {
+    'queries': (1, 2, 5, 10, 20, 50, 100, 200, 500),
+    'db_time': (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+    'serializer_time': (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+    'total_time': (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+}
+
+_state = threading.local()
+
+
+class RequestMetrics:
+    """Queries, database time and serializer time of one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+
+    def server_timing(self, total_time):
+        """Return the value of the Server-Timing header, in milliseconds"""
+        return (
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries", '
+            f'serializer;dur={self.serializer_time * 1000:.1f}, '
+            f'total;dur={total_time * 1000:.1f}'
+        )
+
+
+def current_metrics():
+    """Return the metrics of the request running in this thread, if any"""
+    return getattr(_state, 'metrics', None)
+
+
+def set_current_metrics(metrics):
+    _state.metrics = metrics
+
+
+def count_query(execute, sql, params, many, context):
+    """Database execute wrapper timing the queries of the request"""
+    metrics = current_metrics()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+class Histogram:
+    """Counts of the observed values per bucket, with their sum"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # the last count is for the values over the last bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self):
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        return {
+            'buckets': dict(zip(bounds, self.counts)),
+            'count': self.count,
+            'sum': round(self.sum, 3),
+        }
+
+
+class MetricsRegistry:
+    """Histograms of the request metrics of this process, per view"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, view, metrics, total_time):
+        values = {
+            'queries': metrics.queries,
+            'db_time': metrics.db_time * 1000,
+            'serializer_time': metrics.serializer_time * 1000,
+            'total_time': total_time * 1000,
+        }
+        with self._lock:
+            if view not in self._histograms:
+                self._histograms[view] = {
+                    name: Histogram(buckets)
+                    for name, buckets in BUCKETS.items()
+                }
+            for name, value in values.items():
+                self._histograms[view][name].observe(value)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                view: {name: histogram.as_dict()
+                       for name, histogram in histograms.items()}
+                for view, histograms in self._histograms.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+registry = MetricsRegistry()
+
+
+def view_name(request, view_func):
+    """Return the name of a view, with the action of a viewset"""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{cls.__module__}.{cls.__name__}.{action}'
+
+
+def instrument_serializers():
+    """Time the serialization of the top level serializers
+
+    Serializer and ListSerializer both get their data from
+    BaseSerializer.data, nested serializers are not counted twice.
+    """
+    fget = BaseSerializer.data.fget
+    if getattr(fget, 'instrumented', False):
+        return
+
+    def data(self):
+        metrics = current_metrics()
+        if metrics is None or metrics.serializing:
+            return fget(self)
+        metrics.serializing = True
+        started = time.perf_counter()
+        try:
+            return fget(self)
+        finally:
+            metrics.serializing = False
+            metrics.serializer_time += time.perf_counter() - started
+
+    data.instrumented = True
+    BaseSerializer.data = property(data)
@@ -0,0 +1,174 @@
+import io
+import json
+import time
+import uuid
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Prefetch
+from PIL import Image
+from core.benchmarks import HttpClient, compare, run_load, time_calls
+from core.models import Tag, Ingredient, Recipe
+from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+
+
+HTTP_SCENARIOS = ('recipes', 'recipes-tags', 'recipes-ingredients',
+                  'recipe-detail', 'tags-assigned', 'ingredients-assigned',
+                  'token', 'image-upload')
+RECIPES_URL = '/api/recipe/recipes/'
+TOKEN_URL = '/api/user/token/'
+
+
+def sample_image():
+    """Return a small PNG image and the multipart body uploading it"""
+    data = io.BytesIO()
+    Image.new('RGB', (64, 64), (200, 120, 40)).save(data, format='PNG')
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="image"; '
+        f'filename="benchmark.png"\r\n'
+        f'Content-Type: image/png\r\n\r\n'
+    ).encode() + data.getvalue() + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the recipe API and its serializers"""
+    help = ('Load test a running server and time the recipe serializers, '
+            'on a dataset created by seed_data')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000',
+                            help='Server under test, started with a high '
+                                 'THROTTLE_SCALE')
+        parser.add_argument('--email', default='user0@seed.example.com')
+        parser.add_argument('--password', default='seedpass')
+        parser.add_argument('--scenario', action='append',
+                            choices=HTTP_SCENARIOS,
+                            help='Run only these scenarios, repeatable')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests of each scenario')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Runs of each serializer benchmark')
+        parser.add_argument('--no-http', action='store_true',
+                            help='Only run the serializer benchmarks')
+        parser.add_argument('--no-micro', action='store_true',
+                            help='Only run the HTTP benchmarks')
+        parser.add_argument('--output', help='JSON file of the results')
+        parser.add_argument('--compare',
+                            help='JSON file of a previous run, the command '
+                                 'fails on regressions')
+        parser.add_argument('--threshold', type=float, default=10,
+                            help='Percent of change counted as regression')
+
+    def handle(self, *args, **options):
+        results = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'options': {name: options[name] for name in (
+                'url', 'email', 'requests', 'concurrency', 'repeat')},
+            'http': {},
+            'micro': {},
+        }
+        if not options['no_http']:
+            results['http'] = self.run_http(options)
+        if not options['no_micro']:
+            results['micro'] = self.run_micro(options)
+
+        for group in ('http', 'micro'):
+            for name, summary in results[group].items():
+                self.stdout.write(
+                    f"{name:24} {summary['count']:6} ok "
+                    f"{summary['errors']:4} errors  "
+                    f"{summary.get('throughput', '-'):>8} req/s  "
+                    f"p50 {summary['p50']} p95 {summary['p95']} "
+                    f"p99 {summary['p99']} ms")
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            regressions = compare(baseline, results, options['threshold'])
+            for regression in regressions:
+                self.stderr.write(regression)
+            if regressions:
+                raise CommandError(
+                    f'{len(regressions)} regressions over '
+                    f"{options['threshold']}%")
+            self.stdout.write(self.style.SUCCESS('No regression'))
+
+    def run_http(self, options):
+        """Run the HTTP scenarios against the server"""
+        anonymous = HttpClient(options['url'])
+        credentials = {'email': options['email'],
+                       'password': options['password']}
+        status, body = anonymous.request('POST', TOKEN_URL, credentials)
+        if status != 200:
+            raise CommandError(
+                f"Cannot get a token for {options['email']} ({status})")
+        client = HttpClient(options['url'], json.loads(body)['token'])
+
+        recipes = client.get_json(RECIPES_URL)['results']
+        if not recipes:
+            raise CommandError(f"{options['email']} has no recipes")
+        recipe_ids = [recipe['id'] for recipe in recipes]
+        tag_ids = ','.join(str(tag['id']) for tag in client.get_json(
+            '/api/recipe/tags/?assigned_only=1')['results'][:2])
+        ingredient_ids = ','.join(
+            str(ingredient['id']) for ingredient in client.get_json(
+                '/api/recipe/ingredients/?assigned_only=1')['results'][:2])
+        image, content_type = sample_image()
+
+        def get(path):
+            return lambda number: client.request('GET', path)[0]
+
+        scenarios = {
+            'recipes': get(RECIPES_URL),
+            'recipes-tags': get(f'{RECIPES_URL}?tags={tag_ids}'),
+            'recipes-ingredients': get(
+                f'{RECIPES_URL}?ingredients={ingredient_ids}'),
+            'recipe-detail': lambda number: client.request(
+                'GET',
+                f'{RECIPES_URL}{recipe_ids[number % len(recipe_ids)]}/')[0],
+            'tags-assigned': get('/api/recipe/tags/?assigned_only=1'),
+            'ingredients-assigned': get(
+                '/api/recipe/ingredients/?assigned_only=1'),
+            'token': lambda number: anonymous.request(
+                'POST', TOKEN_URL, credentials)[0],
+            'image-upload': lambda number: client.request(
+                'POST',
+                f'{RECIPES_URL}{recipe_ids[number % len(recipe_ids)]}'
+                f'/upload-image/',
+                image, {'Content-Type': content_type})[0],
+        }
+        results = {}
+        for name in options['scenario'] or HTTP_SCENARIOS:
+            self.stdout.write(f'Running {name}')
+            results[name] = run_load(
+                scenarios[name], options['requests'], options['concurrency'])
+        return results
+
+    def run_micro(self, options):
+        """Time the rendering of a page of recipes by the serializers"""
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['email']} does not exist")
+        recipes = Recipe.objects.filter(user=user).order_by('-id')[:100]
+        # prefetched as the list and detail views do
+        listed = list(recipes.prefetch_related(
+            Prefetch('ingredients', queryset=Ingredient.objects.only('id')),
+            Prefetch('tags', queryset=Tag.objects.only('id'))))
+        detailed = list(recipes.prefetch_related('ingredients', 'tags'))
+
+        results = {}
+        for name, serializer_class, objects in (
+                ('RecipeSerializer', RecipeSerializer, listed),
+                ('RecipeDetailSerializer', RecipeDetailSerializer, detailed)):
+            results[name] = time_calls(
+                lambda: serializer_class(objects, many=True).data,
+                options['repeat'])
+            results[name]['objects'] = len(objects)
+        return results
@@ -0,0 +1,98 @@
+import re
+import uuid
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+from core.models import Tag, Ingredient, Recipe
+
+
+PLAN_INDEX = re.compile(r'Index (?:Only )?Scan (?:Backward )?using (\w+)|'
+                        r'Bitmap Index Scan on (\w+)')
+PLAN_SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+# the ids of the prefetch queries, shortened in the output
+ID_LIST = re.compile(r'IN \((\d+, ){4,}\d+\)')
+
+
+class Command(BaseCommand):
+    """Django command to show the plans of the queries of the API views"""
+    help = ('Run EXPLAIN ANALYZE on the queries of the recipe API views '
+            'for a user, on a database seeded by seed_data')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', default='user0@seed.example.com')
+        parser.add_argument('--host', default='localhost',
+                            help='Host of the requests, one of ALLOWED_HOSTS')
+        parser.add_argument('--no-analyze', action='store_true',
+                            help='Plan the queries without running them')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('explain_queries requires PostgreSQL')
+        try:
+            self.user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['email']} does not exist")
+        self.factory = APIRequestFactory(SERVER_NAME=options['host'])
+        explain = 'EXPLAIN' if options['no_analyze'] else \
+            'EXPLAIN (ANALYZE, BUFFERS)'
+
+        for url in self.get_urls():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'GET {url}'))
+            for sql in self.capture_queries(url):
+                with connection.cursor() as cursor:
+                    cursor.execute(f'{explain} {sql}')
+                    plan = [row[0] for row in cursor.fetchall()]
+                indexes = [first or second for line in plan
+                           for first, second in PLAN_INDEX.findall(line)]
+                scans = [table for line in plan
+                         for table in PLAN_SEQ_SCAN.findall(line)]
+                self.stdout.write(ID_LIST.sub('IN (...)', sql))
+                self.stdout.write('\n'.join(f'  {line}' for line in plan))
+                self.stdout.write(
+                    f"  indexes: {', '.join(indexes) or '-'}  "
+                    f"sequential scans: {', '.join(scans) or '-'}\n")
+
+    def get_urls(self):
+        """Return the urls of the hot requests, with ids of the user"""
+        popular = {}
+        for field, model in (('tags', Tag), ('ingredients', Ingredient)):
+            popular[field] = ','.join(str(pk) for pk in model.objects.filter(
+                user=self.user).order_by('-recipe_count')
+                .values_list('id', flat=True)[:2])
+        recipe = Recipe.objects.filter(user=self.user).order_by('-id').first()
+        if recipe is None:
+            raise CommandError(f'{self.user.email} has no recipes')
+        recipes_url = reverse('recipe:recipe-list')
+        tags_url = reverse('recipe:tag-list')
+        ingredients_url = reverse('recipe:ingredient-list')
+        word = re.findall(r'\w+', recipe.title) or ['recipe']
+        return [
+            recipes_url,
+            f"{recipes_url}?tags={popular['tags']}",
+            f"{recipes_url}?tags={popular['tags']}&match=all",
+            f"{recipes_url}?ingredients={popular['ingredients']}",
+            f'{recipes_url}?q={word[0]}',
+            reverse('recipe:recipe-detail', args=[recipe.id]),
+            tags_url,
+            f'{tags_url}?assigned_only=1',
+            ingredients_url,
+            f'{ingredients_url}?assigned_only=1',
+        ]
+
+    def capture_queries(self, url):
+        """Return the SELECT statements a request to the url runs"""
+        # an unknown parameter misses the response cache
+        separator = '&' if '?' in url else '?'
+        request = self.factory.get(
+            f'{url}{separator}explain={uuid.uuid4().hex}')
+        force_authenticate(request, self.user)
+        match = resolve(url.split('?')[0])
+        with CaptureQueriesContext(connection) as queries:
+            response = match.func(request, *match.args, **match.kwargs)
+        if response.status_code != 200:
+            raise CommandError(f'GET {url} returned {response.status_code}')
+        return [query['sql'] for query in queries
+                if query['sql'].lstrip().upper().startswith('SELECT')]
@@ -0,0 +1,236 @@
+import csv
+import json
+import os
+import time
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from core.cache import bump_data_version
+from core.db.copy import copy_rows, reserve_ids
+from core.models import Tag, Ingredient, Recipe
+
+
+# columns written by COPY, the others are filled in afterwards
+COPY_COLUMNS = ('id', 'user_id', 'title', 'time_minutes', 'price', 'link',
+                'version', 'image_variants')
+
+
+def read_csv(path):
+    """Yield the rows of a CSV file, names are separated with '|'"""
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            for field in ('tags', 'ingredients'):
+                value = row.get(field) or ''
+                row[field] = [name for name in value.split('|') if name]
+            yield row
+
+
+def read_ndjson(path):
+    """Yield the lines of a NDJSON file, as written by the export
+
+    The lines are parsed with the other checks of the row, so a malformed
+    one is skipped as an invalid row.
+    """
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield line
+
+
+def _names(value):
+    """Return the names of a list of names or of {'name': ...} objects"""
+    return [item['name'] if isinstance(item, dict) else str(item)
+            for item in value or ()]
+
+
+class Command(BaseCommand):
+    """Django command to import recipes from CSV or NDJSON files"""
+    help = 'Import recipes for a user from CSV or NDJSON files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+')
+        parser.add_argument('--user', required=True,
+                            help='Email of the owner of the recipes')
+        parser.add_argument('--format', choices=('csv', 'ndjson'),
+                            help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--checkpoint',
+                            help='File recording the progress, the import '
+                                 'resumes from it when it exists')
+        parser.add_argument('--copy', action='store_true',
+                            help='Load the rows with COPY (PostgreSQL only)')
+
+    def handle(self, *args, **options):
+        try:
+            self.user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist")
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy requires PostgreSQL')
+        self.use_copy = options['copy']
+        self.batch_size = options['batch_size']
+        self.checkpoint_path = options['checkpoint']
+        checkpoint = self.read_checkpoint()
+
+        # every name of the user is resolved from memory after this
+        self.ids = {
+            'tags': dict(Tag.objects.filter(
+                user=self.user).values_list('name', 'id')),
+            'ingredients': dict(Ingredient.objects.filter(
+                user=self.user).values_list('name', 'id')),
+        }
+        self.imported = self.errors = 0
+        self.started = time.monotonic()
+
+        for path in options['paths']:
+            if checkpoint.get(path) == 'done':
+                continue
+            self.import_file(path, options['format'], checkpoint)
+
+        bump_data_version(self.user)
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.imported} recipes in {elapsed:.1f}s '
+            f'({self.rate():.0f} rows/s), {self.errors} invalid rows'))
+
+    def import_file(self, path, file_format, checkpoint):
+        """Import the rows of a file in batches, recording the progress"""
+        file_format = file_format or os.path.splitext(path)[1].lstrip('.')
+        readers = {'csv': read_csv, 'ndjson': read_ndjson,
+                   'jsonl': read_ndjson}
+        if file_format not in readers:
+            raise CommandError(f'Unknown format of {path}')
+
+        position = checkpoint.get(path, 0)
+        rows = islice(readers[file_format](path), position, None)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            self.import_batch(batch, path, position)
+            position += len(batch)
+            checkpoint[path] = position
+            self.write_checkpoint(checkpoint)
+            self.stdout.write(
+                f'{path}: {position} rows ({self.rate():.0f} rows/s)')
+        checkpoint[path] = 'done'
+        self.write_checkpoint(checkpoint)
+
+    def parse_row(self, row):
+        """Return an unsaved recipe and its tag and ingredient names"""
+        if isinstance(row, str):
+            row = json.loads(row)
+        if not isinstance(row, dict):
+            raise ValueError('Expected an object')
+        recipe = Recipe(
+            user=self.user,
+            title=str(row['title']),
+            time_minutes=int(row['time_minutes']),
+            price=Decimal(str(row['price'])),
+            link=str(row.get('link') or ''),
+        )
+        # out of range values would fail the whole batch in the database
+        for field in ('title', 'time_minutes', 'price', 'link'):
+            recipe._meta.get_field(field).clean(
+                getattr(recipe, field), recipe)
+        names = {field: _names(row.get(field))
+                 for field in ('tags', 'ingredients')}
+        for field, model in (('tags', Tag), ('ingredients', Ingredient)):
+            max_length = model._meta.get_field('name').max_length
+            if any(not name or len(name) > max_length
+                   for name in names[field]):
+                raise ValueError(f'Invalid {field}')
+        return recipe, names
+
+    def import_batch(self, rows, path, position):
+        """Write a batch of rows in one transaction"""
+        recipes, links = [], []
+        for number, row in enumerate(rows, position + 1):
+            try:
+                recipe, names = self.parse_row(row)
+            except (KeyError, TypeError, ValueError, InvalidOperation,
+                    ValidationError):
+                self.errors += 1
+                self.stderr.write(f'Skipping invalid row {path}:{number}')
+                continue
+            recipes.append(recipe)
+            links.append(names)
+
+        with transaction.atomic():
+            related_ids = {
+                field: self.resolve_names(field, [
+                    name for link in links for name in link[field]])
+                for field in ('tags', 'ingredients')
+            }
+            if self.use_copy:
+                self.copy_recipes(recipes)
+            else:
+                Recipe.objects.bulk_create(recipes, batch_size=1000)
+            for field, ids in related_ids.items():
+                pairs = {
+                    (recipe.id, ids[name])
+                    for recipe, link in zip(recipes, links)
+                    for name in link[field]
+                }
+                if self.use_copy:
+                    self.copy_links(field, pairs)
+                else:
+                    Recipe.objects.add_links(field, pairs)
+            Recipe.objects.filter(
+                id__in=[recipe.id for recipe in recipes]
+            ).update_search_vector()
+        self.imported += len(recipes)
+
+    def resolve_names(self, field, names):
+        """Return the id of each name, creating the unknown ones"""
+        ids = self.ids[field]
+        missing = [name for name in dict.fromkeys(names) if name not in ids]
+        if missing:
+            model = Tag if field == 'tags' else Ingredient
+            for obj in model.objects.get_or_create_names(self.user, missing):
+                ids[obj.name] = obj.id
+        return ids
+
+    def copy_recipes(self, recipes):
+        """Insert the recipes with COPY, reserving their ids first"""
+        for recipe, recipe_id in zip(
+                recipes, reserve_ids(Recipe, len(recipes))):
+            recipe.id = recipe_id
+        copy_rows(Recipe._meta.db_table, COPY_COLUMNS, (
+            [getattr(recipe, column) for column in COPY_COLUMNS]
+            for recipe in recipes
+        ))
+
+    def copy_links(self, field, pairs):
+        """Insert (recipe id, related id) pairs with COPY"""
+        field = Recipe._meta.get_field(field)
+        copy_rows(
+            field.m2m_db_table(),
+            (field.m2m_column_name(), field.m2m_reverse_name()),
+            pairs)
+        field.related_model.objects.change_recipe_counts(
+            Counter(related_id for _, related_id in pairs))
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.imported / elapsed if elapsed else 0
+
+    def read_checkpoint(self):
+        if not self.checkpoint_path or \
+                not os.path.exists(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path) as f:
+            return json.load(f)
+
+    def write_checkpoint(self, checkpoint):
+        """Replace the checkpoint file atomically"""
+        if not self.checkpoint_path:
+            return
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
@@ -0,0 +1,60 @@
+from collections import Counter
+from django.core.management import BaseCommand, CommandError
+from core.profiling import load_profiles, read_stacks
+
+
+class Command(BaseCommand):
+    """Django command to list the request profiles and aggregate them"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', help='Only the profiles of this view')
+        parser.add_argument('--limit', type=int, default=20,
+                            help='Number of the latest profiles listed')
+        parser.add_argument('--aggregate', action='store_true',
+                            help='Print the merged collapsed stacks, for '
+                                 'flamegraph.pl or speedscope')
+        parser.add_argument('--top', type=int, default=0,
+                            help='Print the functions seen the most')
+
+    def handle(self, *args, **options):
+        profiles = load_profiles()
+        if options['view']:
+            profiles = [profile for profile in profiles
+                        if profile['view'] == options['view']]
+        if not profiles:
+            raise CommandError('No profiles found')
+
+        if not options['aggregate'] and not options['top']:
+            for profile in profiles[-options['limit']:]:
+                self.stdout.write(
+                    f"{profile['id']}  {profile['status']}  "
+                    f"{profile['duration']:9.1f} ms  "
+                    f"{profile['samples']:6} samples  "
+                    f"{profile['method']} {profile['path']}  "
+                    f"{profile['view'] or '-'}")
+            return
+
+        stacks = Counter()
+        for profile in profiles:
+            stacks.update(read_stacks(profile['id']))
+        if options['aggregate']:
+            for stack, count in stacks.most_common():
+                self.stdout.write(f'{stack} {count}')
+        if options['top']:
+            self._write_top(stacks, options['top'])
+
+    def _write_top(self, stacks, limit):
+        """Write the functions on top of the stack and in the stack most"""
+        total = sum(stacks.values())
+        own, inclusive = Counter(), Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            # a recursive function is counted once per sample
+            for frame in set(frames):
+                inclusive[frame] += count
+        for title, counts in (('Own samples', own), ('Total', inclusive)):
+            self.stdout.write(title)
+            for frame, count in counts.most_common(limit):
+                self.stdout.write(
+                    f'{count:8} {count * 100 / total:6.1f}%  {frame}')
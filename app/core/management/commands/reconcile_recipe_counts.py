@@ -0,0 +1,33 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from core.models import Tag, Ingredient
+
+
+class Command(BaseCommand):
+    """Django command to repair the recipe counts of tags and ingredients"""
+    help = ('Count again the recipes linked to each tag and ingredient, '
+            'fixing the counts that drifted')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Objects counted in each transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report the wrong counts without fixing')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model in (Tag, Ingredient):
+            fixed = 0
+            last_id = model.objects.aggregate(last=Max('id'))['last'] or 0
+            # short transactions, the objects are locked while counted
+            for first in range(0, last_id + 1, batch_size):
+                with transaction.atomic():
+                    fixed += model.objects.filter(
+                        id__gte=first, id__lt=first + batch_size
+                    ).update_recipe_count()
+                    if options['dry_run']:
+                        transaction.set_rollback(True)
+            verb = 'Found' if options['dry_run'] else 'Fixed'
+            self.stdout.write(
+                f'{verb} {fixed} wrong {model._meta.verbose_name} counts')
@@ -0,0 +1,201 @@
+import random
+import time
+from collections import Counter
+from decimal import Decimal
+from itertools import accumulate
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from core.db.copy import copy_rows, reserve_ids
+from core.models import Tag, Ingredient, Recipe
+
+
+RECIPE_COLUMNS = ('id', 'user_id', 'title', 'time_minutes', 'price', 'link',
+                  'version', 'image_variants')
+# the recipe counts are added as the recipes are linked
+NAME_COLUMNS = ('id', 'user_id', 'name', 'recipe_count')
+
+# the names by popularity, the first ones are drawn the most
+TAG_WORDS = (
+    'Vegetarian', 'Dinner', 'Quick', 'Dessert', 'Vegan', 'Breakfast',
+    'Healthy', 'Lunch', 'Baking', 'Gluten free', 'Comfort food', 'Italian',
+    'Spicy', 'Soup', 'Salad', 'Mexican', 'Asian', 'Snack', 'Party', 'Budget',
+)
+INGREDIENT_WORDS = (
+    'Salt', 'Olive oil', 'Garlic', 'Onion', 'Butter', 'Sugar', 'Flour',
+    'Egg', 'Pepper', 'Milk', 'Tomato', 'Lemon', 'Rice', 'Chicken', 'Cheese',
+    'Potato', 'Carrot', 'Basil', 'Ginger', 'Honey', 'Cream', 'Beans',
+    'Mushroom', 'Spinach', 'Chocolate', 'Yogurt', 'Cinnamon', 'Lime',
+)
+ADJECTIVES = ('Classic', 'Easy', 'Spicy', 'Creamy', 'Roasted', 'Grilled',
+              'Crispy', 'Slow cooked', 'Homemade', 'Summer', 'Winter')
+DISHES = ('curry', 'pasta', 'stew', 'salad', 'soup', 'pie', 'tacos', 'cake',
+          'risotto', 'stir fry', 'burger', 'pancakes', 'casserole')
+
+
+def zipf_weights(count, exponent):
+    """Return the cumulative weights of `count` ranks under Zipf's law"""
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, count + 1)))
+
+
+def ranked_name(words, rank):
+    """Return a distinct name for each popularity rank"""
+    name = words[rank % len(words)]
+    if rank >= len(words):
+        name = f'{name} {rank // len(words) + 1}'
+    return name
+
+
+class Command(BaseCommand):
+    """Django command to generate a synthetic dataset for scale testing"""
+    help = ('Generate users, tags, ingredients and recipes, the same ones '
+            'for the same seed (PostgreSQL only)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=100000,
+                            help='Recipes of all the users')
+        parser.add_argument('--tags', type=int, default=200,
+                            help='Tags of each user')
+        parser.add_argument('--ingredients', type=int, default=500,
+                            help='Ingredients of each user')
+        parser.add_argument('--tags-per-recipe', type=float, default=3,
+                            help='Mean number of tags of a recipe')
+        parser.add_argument('--ingredients-per-recipe', type=float,
+                            default=8,
+                            help='Mean number of ingredients of a recipe')
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='Exponent of the popularity of the users, '
+                                 'tags and ingredients')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--domain', default='seed.example.com',
+                            help='Domain of the emails of the users')
+        parser.add_argument('--password', default='seedpass',
+                            help='Password of every user')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('seed_data requires PostgreSQL')
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1')
+        if get_user_model().objects.filter(
+                email__endswith=f"@{options['domain']}").exists():
+            raise CommandError(
+                f"Users of {options['domain']} exist already, "
+                f"choose another --domain")
+        self.rng = random.Random(options['seed'])
+        self.rows = 0
+        self.started = time.monotonic()
+
+        with transaction.atomic():
+            user_ids = self.create_users(options)
+            related_ids = {
+                'tags': self.create_names(
+                    Tag, user_ids, options['tags'], TAG_WORDS),
+                'ingredients': self.create_names(
+                    Ingredient, user_ids, options['ingredients'],
+                    INGREDIENT_WORDS),
+            }
+
+        user_weights = zipf_weights(len(user_ids), options['zipf'])
+        weights = {
+            'tags': zipf_weights(options['tags'], options['zipf']),
+            'ingredients': zipf_weights(
+                options['ingredients'], options['zipf']),
+        }
+        means = {'tags': options['tags_per_recipe'],
+                 'ingredients': options['ingredients_per_recipe']}
+        created = 0
+        while created < options['recipes']:
+            count = min(options['batch_size'], options['recipes'] - created)
+            owners = self.rng.choices(
+                user_ids, cum_weights=user_weights, k=count)
+            with transaction.atomic():
+                self.create_recipes(created, owners, related_ids,
+                                    weights, means)
+            created += count
+            self.stdout.write(
+                f'{created} recipes ({self.rate():.0f} rows/s)')
+
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(user_ids)} users and {created} recipes, '
+            f'{self.rows} rows in {elapsed:.1f}s '
+            f'({self.rate():.0f} rows/s)'))
+
+    def create_users(self, options):
+        """Create the users, sharing one password hash, return their ids"""
+        # hashing is slow by design, it is done once
+        password = make_password(options['password'])
+        User = get_user_model()
+        users = User.objects.bulk_create([
+            User(email=f"user{number}@{options['domain']}",
+                 name=f'Seed user {number}', password=password)
+            for number in range(options['users'])
+        ], batch_size=options['batch_size'])
+        self.rows += len(users)
+        return [user.id for user in users]
+
+    def create_names(self, model, user_ids, count, words):
+        """Create `count` names per user, return their ids by user and rank"""
+        ids = {}
+        for user_id in user_ids:
+            ids[user_id] = reserve_ids(model, count)
+            copy_rows(model._meta.db_table, NAME_COLUMNS, (
+                (related_id, user_id, ranked_name(words, rank), 0)
+                for rank, related_id in enumerate(ids[user_id])
+            ))
+            self.rows += count
+        return ids
+
+    def draw(self, related_ids, weights, mean):
+        """Return a few distinct ids, the popular ones more often"""
+        if not related_ids or not mean:
+            return []
+        # the fan-out is exponentially distributed around the mean
+        count = min(len(related_ids), round(self.rng.expovariate(1 / mean)))
+        drawn = self.rng.choices(related_ids, cum_weights=weights, k=count)
+        return list(dict.fromkeys(drawn))
+
+    def create_recipes(self, first, owners, related_ids, weights, means):
+        """Create a batch of recipes with their tags and ingredients"""
+        rng = self.rng
+        recipe_ids = reserve_ids(Recipe, len(owners))
+        rows, links = [], {'tags': [], 'ingredients': []}
+        for number, (recipe_id, user_id) in enumerate(
+                zip(recipe_ids, owners), first):
+            price = min(rng.lognormvariate(2.3, 0.6), 999.99)
+            link = f'https://recipes.example.com/{number}' \
+                if rng.random() < 0.3 else ''
+            rows.append((
+                recipe_id, user_id,
+                f'{rng.choice(ADJECTIVES)} {rng.choice(DISHES)}',
+                max(1, int(rng.lognormvariate(3.4, 0.7))),
+                Decimal(f'{price:.2f}'), link, 0, {},
+            ))
+            for field in links:
+                links[field].extend(
+                    (recipe_id, related_id)
+                    for related_id in self.draw(
+                        related_ids[field][user_id], weights[field],
+                        means[field]))
+
+        copy_rows(Recipe._meta.db_table, RECIPE_COLUMNS, rows)
+        for field, pairs in links.items():
+            m2m = Recipe._meta.get_field(field)
+            copy_rows(
+                m2m.m2m_db_table(),
+                (m2m.m2m_column_name(), m2m.m2m_reverse_name()),
+                pairs)
+            m2m.related_model.objects.change_recipe_counts(
+                Counter(related_id for _, related_id in pairs))
+            self.rows += len(pairs)
+        Recipe.objects.filter(id__in=recipe_ids).update_search_vector()
+        self.rows += len(rows)
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.rows / elapsed if elapsed else 0
@@ -1,21 +1,42 @@
+import random
 import time
-from django.db import connections
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.db.utils import OperationalError
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from core.health import database_latency
 
 
 class Command(BaseCommand):
     """Django command to pause execution until database is available"""
 
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--timeout', type=float, default=60,
+                            help='Seconds to wait before giving up')
+        parser.add_argument('--max-delay', type=float, default=5,
+                            help='Longest wait between two attempts')
+
     def handle(self, *args, **options):
 
         self.stdout.write('Waiting for database')
-        db_conn = None
-        while not db_conn:
+        deadline = time.monotonic() + options['timeout']
+        delay = 0.1
+        while True:
             try:
-                db_conn = connections['default']
+                # runs a query, fetching the connection opens no socket
+                database_latency(options['database'])
+                break
             except OperationalError:
+                connections[options['database']].close()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        f"Database not available after {options['timeout']}"
+                        f" seconds")
+                # exponential backoff with full jitter
+                wait = min(random.uniform(0, delay), remaining)
                 self.stdout.write(
-                    'Database not available, waiting 1 second...')
-                time.sleep(1)
+                    f'Database not available, waiting {wait:.2f} seconds...')
+                time.sleep(wait)
+                delay = min(delay * 2, options['max_delay'])
         self.stdout.write(self.style.SUCCESS('Database available'))
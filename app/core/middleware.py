@@ -0,0 +1,161 @@
+import hashlib
+import random
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import connections
+from django.db.utils import OperationalError
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from core.authentication import CachedTokenAuthentication
+from core.db.routers import choose_replica, get_read_database, mark_down, \
+    set_read_database
+from core.instrumentation import RequestMetrics, count_query, registry, \
+    set_current_metrics, view_name
+from core.profiling import StackSampler, save_profile
+
+
+def _pin_key(client):
+    return 'replica-pin:' + hashlib.md5(client.encode('utf-8')).hexdigest()
+
+
+def _client_key(request):
+    """Return the cache key of the client, by token or else by address"""
+    return _pin_key(request.META.get('HTTP_AUTHORIZATION') or
+                    request.META.get('REMOTE_ADDR', ''))
+
+
+def _issued_token_key(response):
+    """Return the cache key of the token a login returned, if any"""
+    data = getattr(response, 'data', None)
+    token = data.get('token') if isinstance(data, dict) else None
+    return _pin_key(f'Token {token}') if isinstance(token, str) else None
+
+
+class ReplicaMiddleware:
+    """Serve the reads of safe requests from a replica
+
+    A client that sent a write reads from the primary for the next
+    REPLICA_PIN_SECONDS, so it always sees its own writes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # a pin only seen by one process lets the others read stale data
+        if settings.REPLICA_DATABASES and isinstance(
+                caches[settings.REPLICA_PIN_CACHE], LocMemCache):
+            raise ImproperlyConfigured(
+                'REPLICA_PIN_CACHE must be shared by the processes, set '
+                'REPLICA_PIN_CACHE_LOCATION with DB_REPLICA_HOSTS')
+
+    def __call__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+
+        cache = caches[settings.REPLICA_PIN_CACHE]
+        key = _client_key(request)
+        if request.method in SAFE_METHODS and not cache.get(key):
+            set_read_database(choose_replica())
+        try:
+            response = self.get_response(request)
+        finally:
+            set_read_database(None)
+        if request.method not in SAFE_METHODS:
+            pins = {key: True}
+            # the next requests of a client that logged in carry the token
+            token_key = _issued_token_key(response)
+            if token_key:
+                pins[token_key] = True
+            cache.set_many(pins, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    def process_exception(self, request, exception):
+        # the next requests fail over to another replica or the primary
+        alias = get_read_database()
+        if alias and isinstance(exception, OperationalError):
+            mark_down(alias)
+
+
+class InstrumentationMiddleware:
+    """Measure the queries, database and serializer time of each request
+
+    The times are sent in a Server-Timing header and added to the
+    histograms of the view, served by /api/metrics/requests/.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        set_current_metrics(metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(count_query))
+                response = self.get_response(request)
+        finally:
+            set_current_metrics(None)
+        total_time = time.perf_counter() - started
+
+        response['Server-Timing'] = metrics.server_timing(total_time)
+        view = getattr(request, 'view_name', None)
+        if view:
+            registry.observe(view, metrics, total_time)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_name = view_name(request, view_func)
+
+
+class ProfilingMiddleware:
+    """Sample the stack of profiled requests, saved in PROFILING_DIR
+
+    A staff user profiles a request by sending an X-Profile header, the id
+    of the profile comes back in X-Profile-Id. PROFILING_SAMPLE_RATE of
+    the other requests are profiled at random.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        requested = 'HTTP_X_PROFILE' in request.META and \
+            self.is_staff(request)
+        sampled = random.random() < settings.PROFILING_SAMPLE_RATE
+        if not requested and not sampled:
+            return self.get_response(request)
+
+        sampler = StackSampler(interval=settings.PROFILING_INTERVAL)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        duration = time.perf_counter() - started
+
+        profile_id = save_profile(
+            sampler, method=request.method, path=request.path,
+            view=getattr(request, 'view_name', None),
+            status=response.status_code,
+            duration=round(duration * 1000, 3), created=time.time())
+        if requested:
+            response['X-Profile-Id'] = profile_id
+        return response
+
+    def is_staff(self, request):
+        """Return whether the token of the request is a staff user's"""
+        # before the view, so the other clients never pay for sampling
+        try:
+            credentials = CachedTokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return credentials is not None and credentials[0].is_staff
@@ -0,0 +1,40 @@
+# Generated by Django 2.1.15 on 2026-10-18 02:39
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# index the recipes created before the search vector existed
+BACKFILL_SQL = """
+UPDATE core_recipe r SET search_vector =
+    setweight(to_tsvector('english', r.title), 'A') ||
+    setweight(to_tsvector('english',
+        coalesce((SELECT string_agg(t.name, ' ')
+                  FROM core_tag t
+                  JOIN core_recipe_tags rt ON rt.tag_id = t.id
+                  WHERE rt.recipe_id = r.id), '') || ' ' ||
+        coalesce((SELECT string_agg(i.name, ' ')
+                  FROM core_ingredient i
+                  JOIN core_recipe_ingredients ri ON ri.ingredient_id = i.id
+                  WHERE ri.recipe_id = r.id), '')), 'B');
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='core_recipe_search__c01407_gin'),
+        ),
+    ]
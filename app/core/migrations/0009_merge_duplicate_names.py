@@ -0,0 +1,46 @@
+# Generated by Django 2.1.15 on 2026-10-18 02:44
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Merge the tags and ingredients a user created more than once
+
+    The recipes linked to a duplicate are linked to the oldest object with
+    the same name instead, then the duplicates are deleted.
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, field).through
+        column = f'{model_name.lower()}_id'
+        duplicates = model.objects.values('user_id', 'name') \
+            .annotate(keep=Min('id'), count=Count('id')).filter(count__gt=1)
+        for duplicate in duplicates:
+            keep = duplicate['keep']
+            ids = list(model.objects.filter(
+                user_id=duplicate['user_id'], name=duplicate['name']
+            ).exclude(id=keep).values_list('id', flat=True))
+            linked = set(through.objects.filter(
+                **{column: keep}).values_list('recipe_id', flat=True))
+            for link in through.objects.filter(**{f'{column}__in': ids}):
+                if link.recipe_id in linked:
+                    link.delete()
+                else:
+                    setattr(link, column, keep)
+                    link.save()
+                    linked.add(link.recipe_id)
+            model.objects.filter(id__in=ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_recipe_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names,
+                             migrations.RunPython.noop),
+    ]
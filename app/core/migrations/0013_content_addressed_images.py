@@ -0,0 +1,42 @@
+# Generated by Django 2.1.15 on 2026-10-18 02:56
+
+import core.models
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_image_references(apps, schema_editor):
+    """Count the references to the images uploaded so far"""
+    Recipe = apps.get_model('core', 'Recipe')
+    ImageFile = apps.get_model('core', 'ImageFile')
+    references = Recipe.objects.exclude(image__isnull=True).exclude(image='') \
+        .values('image').annotate(refcount=Count('id'))
+    ImageFile.objects.bulk_create([
+        ImageFile(name=row['image'], refcount=row['refcount'])
+        for row in references
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_imageupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=core.models.RecipeImageField(null=True, storage=core.storage.ContentAddressedStorage(), upload_to=core.models.recipe_image_file_path),
+        ),
+        migrations.RunPython(
+            count_image_references, migrations.RunPython.noop),
+    ]
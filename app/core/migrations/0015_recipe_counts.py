@@ -0,0 +1,39 @@
+# Generated by Django 2.1.15 on 2026-10-18 03:22
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_recipes(apps, schema_editor):
+    """Count the recipes linked to the existing tags and ingredients"""
+    Recipe = apps.get_model('core', 'Recipe')
+    for field in ('tags', 'ingredients'):
+        m2m = Recipe._meta.get_field(field)
+        column = m2m.m2m_reverse_name()
+        links = m2m.remote_field.through.objects \
+            .filter(**{column: OuterRef('pk')}) \
+            .values(column).annotate(count=Count('*')).values('count')
+        m2m.related_model.objects.update(recipe_count=Coalesce(
+            Subquery(links, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_per_user_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_recipes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.1.15 on 2026-10-18 09:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_recipe_counts'),
+    ]
+
+    operations = [
+        # the assigned_only listings only read the names used by a recipe
+        migrations.RunSQL(
+            'CREATE INDEX core_tag_assigned_idx '
+            'ON core_tag (user_id, name, id) WHERE recipe_count > 0',
+            'DROP INDEX core_tag_assigned_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX core_ingredient_assigned_idx '
+            'ON core_ingredient (user_id, name, id) WHERE recipe_count > 0',
+            'DROP INDEX core_ingredient_assigned_idx',
+        ),
+    ]
@@ -1,19 +1,36 @@
+import logging
+import re
 import uuid
 import os
-from django.db import models
+from collections import Counter
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, \
+    SearchVector, SearchVectorField
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models.fields.files import ImageFieldFile
+from django.db.models import Count, DecimalField, F, IntegerField, \
+    OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Cast, Coalesce
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
     PermissionsMixin
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 from django.conf import settings
+from core.storage import ContentAddressedStorage
+
+
+logger = logging.getLogger(__name__)
 
 
 def recipe_image_file_path(instance, filename):
-    """Generate file path for new recipe image"""
+    """Generate file path for new recipe image
+
+    The storage replaces the name of the file with the hash of its content.
+    """
     ext = filename.split('.')[-1]
-    uid = uuid.uuid4()
-    filename = f'{uid}.{ext}'
-    return os.path.join('uploads/recipe/', filename)
+    return os.path.join('uploads/recipe/', f'image.{ext}')
 
 
 class UserManager(BaseUserManager):
@@ -47,6 +64,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # bumped on every write to the user's recipes, tags or ingredients
+    data_version = models.PositiveIntegerField(default=0, editable=False)
 
     objects = UserManager()
     USERNAME_FIELD = 'email'
@@ -58,6 +77,68 @@ class User(AbstractBaseUser, PermissionsMixin):
 # ------------------------------------------------------------
 
 
+class NamedQuerySet(models.QuerySet):
+    """Queries on the objects a user names, like tags and ingredients"""
+
+    def get_or_create_names(self, user, names):
+        """Return the objects of the user with the names, in order
+
+        The missing ones are created with a single INSERT ... ON CONFLICT
+        statement, so concurrent calls never create duplicates.
+        """
+        names = list(dict.fromkeys(names))
+        table = connections[self.db].ops.quote_name(self.model._meta.db_table)
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (name, user_id, recipe_count) '
+                f'SELECT unnest(%s::text[]), %s, 0 '
+                f'ON CONFLICT (user_id, name) DO NOTHING',
+                [names, user.pk]
+            )
+        by_name = {obj.name: obj
+                   for obj in self.filter(user=user, name__in=names)}
+        return [by_name[name] for name in names]
+
+    def change_recipe_counts(self, changes):
+        """Add to the recipe count of each object id its change
+
+        The changes are applied in one statement, the links inserted or
+        deleted without m2m_changed are counted this way. A count that
+        would go below zero has drifted, it is logged and left at zero
+        for reconcile_recipe_counts to fix.
+        """
+        changes = sorted((pk, n) for pk, n in changes.items() if n)
+        if not changes:
+            return
+        table = connections[self.db].ops.quote_name(self.model._meta.db_table)
+        sql = (f'UPDATE {table} SET recipe_count = {{}} '
+               f'FROM unnest(%s::integer[], %s::integer[]) AS change(id, n) '
+               f'WHERE {table}.id = change.id')
+        params = [[pk for pk, _ in changes], [n for _, n in changes]]
+        count = f'{table}.recipe_count + n'
+        with connections[self.db].cursor() as cursor:
+            if all(n > 0 for _, n in changes):
+                cursor.execute(sql.format(count), params)
+                return
+            try:
+                with transaction.atomic(using=self.db):
+                    cursor.execute(sql.format(count), params)
+            except IntegrityError:
+                logger.warning(
+                    'Some %s recipe counts went below zero, run '
+                    'reconcile_recipe_counts', self.model._meta.verbose_name)
+                cursor.execute(sql.format(f'GREATEST({count}, 0)'), params)
+
+    def update_recipe_count(self):
+        """Count again the recipes of the objects, return the fixed ones"""
+        link = self.model._meta.get_field('recipe')
+        column = link.field.m2m_reverse_name()
+        links = link.through.objects.filter(**{column: OuterRef('pk')}) \
+            .values(column).annotate(count=Count('*')).values('count')
+        count = Coalesce(Subquery(links, output_field=IntegerField()), 0)
+        return self.exclude(recipe_count=count).update(recipe_count=count)
+
+
 class Tag(models.Model):
     """Tag to be used for a recipe"""
     name = models.CharField(max_length=200)
@@ -65,6 +146,15 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    # recipes linked to the tag, kept up to date by core.signals
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = NamedQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('user', 'name')
+        # the lists are paginated on (name, id) within a user
+        indexes = [models.Index(fields=['user', 'name', 'id'])]
 
     def __str__(self):
         return self.name
@@ -77,11 +167,105 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.DO_NOTHING
     )
+    # recipes using the ingredient, kept up to date by core.signals
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = NamedQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('user', 'name')
+        # the lists are paginated on (name, id) within a user
+        indexes = [models.Index(fields=['user', 'name', 'id'])]
 
     def __str__(self):
         return self.name
 
 
+class PrefixSearchQuery(SearchQuery):
+    """Search query matching every word of the text as a prefix"""
+
+    def __init__(self, value, **kwargs):
+        terms = re.findall(r'\w+', value)
+        super().__init__(' & '.join(f'{term}:*' for term in terms), **kwargs)
+
+    def as_sql(self, compiler, connection):
+        sql, params = super().as_sql(compiler, connection)
+        return sql.replace('plainto_tsquery', 'to_tsquery', 1), params
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Queries on recipes"""
+    search_config = 'english'
+
+    def _names(self, model):
+        """Return a subquery joining the names linked to each recipe"""
+        names = model.objects.filter(recipe=OuterRef('pk')) \
+            .values('recipe').annotate(names=StringAgg('name', ' ')) \
+            .values('names')
+        return Subquery(names, output_field=TextField())
+
+    def add_links(self, field, links, batch_size=1000):
+        """Insert (recipe id, related id) pairs in the through table
+
+        The rows are inserted in batches without sending m2m_changed, the
+        recipe counts of the related objects are updated once.
+        """
+        m2m = self.model._meta.get_field(field)
+        through = m2m.remote_field.through
+        column = m2m.m2m_reverse_name()
+        links = list(links)
+        through.objects.using(self.db).bulk_create(
+            [through(recipe_id=recipe_id, **{column: related_id})
+             for recipe_id, related_id in links],
+            batch_size=batch_size)
+        m2m.related_model.objects.using(self.db).change_recipe_counts(
+            Counter(related_id for _, related_id in links))
+
+    def remove_links(self, field):
+        """Delete the links of the recipes to their tags or ingredients"""
+        m2m = self.model._meta.get_field(field)
+        column = m2m.m2m_reverse_name()
+        links = m2m.remote_field.through.objects.using(self.db).filter(
+            recipe_id__in=self.values('id'))
+        removed = Counter(links.values_list(column, flat=True))
+        links.delete()
+        m2m.related_model.objects.using(self.db).change_recipe_counts(
+            {pk: -n for pk, n in removed.items()})
+
+    def update_search_vector(self):
+        """Recompute the stored search vector of the recipes"""
+        return self.update(search_vector=(
+            SearchVector('title', weight='A', config=self.search_config) +
+            SearchVector(self._names(Tag), self._names(Ingredient),
+                         weight='B', config=self.search_config)
+        ))
+
+    def search(self, text):
+        """Return the recipes matching the text annotated with a rank"""
+        rank_field = DecimalField(max_digits=12, decimal_places=6)
+        if not re.search(r'\w', text):
+            # still ranked, the results are ordered by rank
+            return self.none().annotate(rank=Value(0, rank_field))
+        query = PrefixSearchQuery(text, config=self.search_config)
+        # the rank is rounded so it can be compared exactly by the cursor
+        rank = Cast(SearchRank(F('search_vector'), query), rank_field)
+        return self.annotate(rank=rank).filter(search_vector=query)
+
+
+class RecipeImageFieldFile(ImageFieldFile):
+    """Recipe image, flagging the recipe when a new file is stored"""
+
+    def save(self, name, content, save=True):
+        # the storage counted a reference to the new file, core.signals
+        # releases the previous one once the recipe is saved
+        self.instance._image_stored = True
+        super().save(name, content, save)
+
+
+class RecipeImageField(models.ImageField):
+    attr_class = RecipeImageFieldFile
+
+
 class Recipe(models.Model):
     """Recipe object"""
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
@@ -93,7 +277,101 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = RecipeImageField(null=True, upload_to=recipe_image_file_path,
+                             storage=ContentAddressedStorage())
+    # storage names of the resized images, built by core.images
+    image_variants = JSONField(default=dict, blank=True, editable=False)
+    # incremented on every update, used as the ETag of the recipe
+    version = models.PositiveIntegerField(default=0, editable=False)
+    # title, tag and ingredient names, kept up to date by core.signals
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector']),
+            # the list is paginated on the id within a user
+            models.Index(fields=['user', 'id']),
+        ]
 
     def __str__(self):
         return self.title
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        recipe = super().from_db(db, field_names, values)
+        # the stored image, released by core.signals once it is replaced
+        recipe._image_name = recipe.__dict__.get('image')
+        return recipe
+
+
+class ImageUpload(models.Model):
+    """Resumable upload of a recipe image, written to disk chunk by chunk"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    recipe = models.ForeignKey('Recipe', on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveIntegerField()
+    # number of bytes received so far
+    offset = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def path(self):
+        """Return the path of the partial file"""
+        return os.path.join(settings.IMAGE_UPLOAD_DIR, f'{self.id}.part')
+
+    def __str__(self):
+        return self.filename
+
+
+class ImageFileQuerySet(models.QuerySet):
+    """Reference counting of the content addressed image files"""
+
+    def lock(self, name):
+        """Lock the name of a file until the end of the transaction
+
+        Storing a file and deleting an unreferenced one both take the lock,
+        so a file is never deleted while a new reference reuses it.
+        """
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_advisory_xact_lock(hashtext(%s))', [name])
+
+    def acquire(self, name):
+        """Count a new reference to the file"""
+        self.lock(name)
+        table = connections[self.db].ops.quote_name(self.model._meta.db_table)
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (name, refcount) VALUES (%s, 1) '
+                f'ON CONFLICT (name) DO UPDATE '
+                f'SET refcount = {table}.refcount + 1',
+                [name]
+            )
+
+    def release(self, name):
+        """Drop a reference, return whether it was the last one"""
+        table = connections[self.db].ops.quote_name(self.model._meta.db_table)
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET refcount = refcount - 1 '
+                f'WHERE name = %s AND refcount > 0 RETURNING refcount',
+                [name]
+            )
+            row = cursor.fetchone()
+        if row is None or row[0]:
+            return False
+        self.filter(name=name, refcount=0).delete()
+        return True
+
+
+class ImageFile(models.Model):
+    """Number of recipes referencing a stored image"""
+    name = models.CharField(max_length=255, primary_key=True)
+    refcount = models.PositiveIntegerField(default=0)
+
+    objects = ImageFileQuerySet.as_manager()
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,91 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from django.conf import settings
+
+
+class StackSampler:
+    """Sample the call stack of a thread at a fixed interval
+
+    The samples are kept as collapsed stacks, one line per distinct stack
+    with the number of times it was seen, the format read by flamegraph.pl
+    and speedscope.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                module = frame.f_globals.get('__name__', '?')
+                names.append(f'{module}.{code.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def collapsed(self):
+        """Return the samples as collapsed stacks"""
+        return ''.join(f'{stack} {count}\n'
+                       for stack, count in self.stacks.most_common())
+
+
+def save_profile(sampler, **info):
+    """Write a profile and its description to PROFILING_DIR, return its id"""
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    profile_id = f'{time.strftime("%Y%m%dT%H%M%S")}-{uuid.uuid4().hex[:8]}'
+    path = os.path.join(settings.PROFILING_DIR, profile_id)
+    with open(f'{path}.collapsed', 'w') as f:
+        f.write(sampler.collapsed())
+    info.update(id=profile_id, samples=sampler.samples,
+                interval=sampler.interval)
+    with open(f'{path}.json', 'w') as f:
+        json.dump(info, f)
+    return profile_id
+
+
+def load_profiles(directory=None):
+    """Return the descriptions of the stored profiles, oldest first"""
+    directory = directory or settings.PROFILING_DIR
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name)) as f:
+                profiles.append(json.load(f))
+    return sorted(profiles, key=lambda profile: profile['created'])
+
+
+def read_stacks(profile_id, directory=None):
+    """Return the collapsed stacks of a profile as a Counter"""
+    directory = directory or settings.PROFILING_DIR
+    stacks = Counter()
+    with open(os.path.join(directory, f'{profile_id}.collapsed')) as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            stacks[stack] += int(count)
+    return stacks
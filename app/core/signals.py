@@ -0,0 +1,163 @@
+import os
+import threading
+from contextlib import contextmanager
+from django.db.models.signals import m2m_changed, post_delete, post_save, \
+    pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from core.authentication import get_token_cache
+from core.images import release_image
+from core.models import Tag, Ingredient, Recipe, ImageUpload, User
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, update_fields=None, **kwargs):
+    """Index the title of a saved recipe"""
+    if update_fields and 'title' not in update_fields:
+        return
+    Recipe.objects.filter(pk=instance.pk).update_search_vector()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, **kwargs):
+    """Release the image a saved recipe no longer references"""
+    stored = instance.__dict__.pop('_image_stored', False)
+    if 'image' not in instance.__dict__:
+        return
+    old, new = getattr(instance, '_image_name', None), instance.image.name
+    # storing the same image again counted a second reference
+    if old and (old != new or stored):
+        release_image(old)
+    instance._image_name = new
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Release the image of a deleted recipe"""
+    name = getattr(instance, '_image_name', None)
+    if name:
+        release_image(name)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_links_changed(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    """Index the tag and ingredient names linked to a recipe"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Recipe.objects.filter(pk=instance.pk).update_search_vector()
+        return
+
+    # the instance is a tag or an ingredient, pk_set holds recipe ids
+    if action == 'pre_clear':
+        instance._cleared_recipe_ids = list(
+            instance.recipe_set.values_list('id', flat=True))
+    elif action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_recipe_ids', ())
+    if action in ('post_add', 'post_remove', 'post_clear') and pk_set:
+        Recipe.objects.filter(pk__in=pk_set).update_search_vector()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_links_counted(sender, instance, action, reverse, model, pk_set,
+                         **kwargs):
+    """Count the recipes linked to each tag and ingredient
+
+    The removed links are counted before they are deleted, pk_set holds
+    every id passed to remove(), linked or not.
+    """
+    if reverse:
+        # the instance is a tag or an ingredient, pk_set holds recipe ids
+        if action == 'post_add':
+            change = len(pk_set)
+        elif action == 'pre_remove':
+            change = -instance.recipe_set.filter(pk__in=pk_set).count()
+        elif action == 'pre_clear':
+            change = -instance.recipe_set.count()
+        else:
+            return
+        type(instance).objects.change_recipe_counts({instance.pk: change})
+        return
+
+    if action == 'post_add':
+        model.objects.change_recipe_counts({pk: 1 for pk in pk_set})
+    elif action in ('pre_remove', 'pre_clear'):
+        linked = model.objects.filter(recipe=instance)
+        if action == 'pre_remove':
+            linked = linked.filter(pk__in=pk_set)
+        model.objects.change_recipe_counts(
+            {pk: -1 for pk in linked.values_list('pk', flat=True)})
+
+
+_deleting = threading.local()
+
+
+@contextmanager
+def recipes_uncounted():
+    """Skip uncounting each deleted recipe, for deletes counted in bulk"""
+    _deleting.uncounted = True
+    try:
+        yield
+    finally:
+        _deleting.uncounted = False
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    """Uncount a deleted recipe from its tags and ingredients"""
+    if getattr(_deleting, 'uncounted', False):
+        return
+    for model in (Tag, Ingredient):
+        model.objects.change_recipe_counts({
+            pk: -1 for pk in model.objects.filter(
+                recipe=instance).values_list('pk', flat=True)})
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def recipe_attr_saved(sender, instance, created, **kwargs):
+    """Reindex the recipes of a renamed tag or ingredient"""
+    if not created:
+        Recipe.objects.filter(
+            pk__in=instance.recipe_set.values('id')).update_search_vector()
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def recipe_attr_deleting(sender, instance, **kwargs):
+    """Remember the recipes of a tag or ingredient being deleted"""
+    instance._deleted_recipe_ids = list(
+        instance.recipe_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def recipe_attr_deleted(sender, instance, **kwargs):
+    """Reindex the recipes of a deleted tag or ingredient"""
+    recipe_ids = instance.__dict__.pop('_deleted_recipe_ids', ())
+    if recipe_ids:
+        Recipe.objects.filter(pk__in=recipe_ids).update_search_vector()
+
+
+@receiver(post_delete, sender=ImageUpload)
+def image_upload_deleted(sender, instance, **kwargs):
+    """Remove the partial file of a finished or abandoned upload"""
+    try:
+        os.remove(instance.path)
+    except FileNotFoundError:
+        pass
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Forget the user of a deleted token"""
+    get_token_cache().delete(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    """Forget the tokens of a changed user, deactivated for instance"""
+    if not created:
+        get_token_cache().delete_user(instance.pk)
@@ -0,0 +1,57 @@
+import hashlib
+import os
+import re
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+
+# the stem of the content addressed files is the SHA-256 of their content
+CONTENT_ADDRESSED_NAME = re.compile(r'(^|/)[0-9a-f]{64}(_\w+)?\.\w+$')
+
+
+def file_digest(content):
+    """Return the SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_content_addressed(name):
+    """Return whether the file (or variant) is named after its content"""
+    return bool(CONTENT_ADDRESSED_NAME.search(name))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming the files after their content
+
+    Identical files are stored once, every save counts a reference in
+    ImageFile and core.images.release_image drops it.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        directory, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        digest = file_digest(content)
+        name = os.path.join(directory, digest[:2], f'{digest}{ext}')
+        return super().save(name, content, max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # a file with the same name has the same content
+        return name
+
+    def _save(self, name, content):
+        from core.models import ImageFile
+
+        # the reference is counted first, its lock keeps a concurrent
+        # release from deleting the file being reused
+        with transaction.atomic():
+            ImageFile.objects.acquire(name)
+            if self.exists(name):
+                return name
+            return super()._save(name, content)
@@ -0,0 +1,33 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class _QueryBudgetContext(CaptureQueriesContext):
+
+    def __init__(self, test_case, budget, connection):
+        self.test_case = test_case
+        self.budget = budget
+        super().__init__(connection)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+        queries = [query['sql'] for query in self.captured_queries]
+        self.test_case.assertLessEqual(
+            len(queries), self.budget,
+            f'{len(queries)} queries executed, the budget is {self.budget}'
+            f'\n' + '\n'.join(
+                f'{number}. {sql}' for number, sql in enumerate(queries, 1)))
+
+
+class QueryBudgetMixin:
+    """Test case assertions catching N+1 queries"""
+
+    def assertMaxQueries(self, budget, using=DEFAULT_DB_ALIAS):
+        """Fail when the block runs more queries than the budget
+
+            with self.assertMaxQueries(3):
+                self.client.get(RECIPES_URL)
+        """
+        return _QueryBudgetContext(self, budget, connections[using])
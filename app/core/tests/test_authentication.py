@@ -0,0 +1,105 @@
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from core.authentication import CachedTokenAuthentication, TokenCache
+
+
+ME_URL = reverse('user:me')
+
+
+class TokenCacheTests(TestCase):
+
+    def test_least_recently_used_are_evicted(self):
+        """Test the cache keeps at most max_entries tokens"""
+        cache = TokenCache(max_entries=2)
+        cache.set('a', {'user_id': 1})
+        cache.set('b', {'user_id': 2})
+        cache.get('a')
+        cache.set('c', {'user_id': 3})
+
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+
+    @patch('core.authentication.time.monotonic')
+    def test_entries_expire(self, mock_monotonic):
+        """Test the tokens are forgotten after the timeout"""
+        cache = TokenCache(timeout=60)
+        mock_monotonic.return_value = 100
+        cache.set('a', {'user_id': 1})
+
+        mock_monotonic.return_value = 159
+        self.assertIsNotNone(cache.get('a'))
+        mock_monotonic.return_value = 161
+        self.assertIsNone(cache.get('a'))
+
+    def test_no_timeout_not_cached(self):
+        """Test a timeout of 0 always checks the database"""
+        cache = TokenCache(timeout=0)
+        cache.set('a', {'user_id': 1})
+
+        self.assertIsNone(cache.get('a'))
+
+
+@override_settings(TOKEN_CACHE={'max_entries': 16, 'timeout': 60})
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass', name='Test')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_is_cached(self):
+        """Test the token is only looked up on the first request"""
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_data_version_is_loaded_when_used(self):
+        """Test a cached user never carries an outdated data version"""
+        auth = CachedTokenAuthentication()
+        auth.authenticate_credentials(self.token.key)
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            data_version=F('data_version') + 5)
+
+        user, token = auth.authenticate_credentials(self.token.key)
+
+        self.assertEqual(user.data_version, 5)
+        self.assertEqual(token.user, user)
+
+    def test_deleted_token_is_forgotten(self):
+        """Test a deleted token no longer authenticates"""
+        self.client.get(ME_URL)
+        self.token.delete()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_forgotten(self):
+        """Test the tokens of a deactivated user no longer authenticate"""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_is_seen(self):
+        """Test changing the password reloads the user"""
+        self.client.get(ME_URL)
+        self.client.patch(ME_URL, {'password': 'newpassword123'})
+
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
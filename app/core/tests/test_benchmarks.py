@@ -0,0 +1,125 @@
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import LiveServerTestCase, SimpleTestCase, override_settings
+from core.benchmarks import compare, percentile, run_load, summarize
+from core.models import Tag, Ingredient, Recipe
+
+
+class BenchmarkStatisticsTests(SimpleTestCase):
+
+    def test_percentile(self):
+        """Test the nearest rank percentiles"""
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertIsNone(percentile([], 50))
+
+    def test_summarize(self):
+        """Test the durations are summarized in milliseconds"""
+        summary = summarize([0.002, 0.001, 0.003], errors=1, elapsed=0.5)
+
+        self.assertEqual(summary['count'], 3)
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(summary['p50'], 2.0)
+        self.assertEqual(summary['p99'], 3.0)
+        self.assertEqual(summary['throughput'], 6.0)
+
+    def test_run_load_counts_errors(self):
+        """Test the failed requests are counted apart"""
+        summary = run_load(
+            lambda number: 500 if number % 4 == 0 else 200, 8, 2)
+
+        self.assertEqual(summary['count'], 6)
+        self.assertEqual(summary['errors'], 2)
+        self.assertEqual(summary['statuses'], {'200': 6, '500': 2})
+
+    def test_compare_flags_regressions(self):
+        """Test the changes over the threshold are reported"""
+        baseline = {'http': {'recipes': {'p95': 10, 'throughput': 100}},
+                    'micro': {'RecipeSerializer': {'p95': 2}}}
+        results = {'http': {'recipes': {'p95': 10.5, 'throughput': 80}},
+                   'micro': {'RecipeSerializer': {'p95': 3},
+                             'NewSerializer': {'p95': 1}}}
+
+        regressions = compare(baseline, results, 10)
+
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith('recipes: throughput'))
+        self.assertTrue(regressions[1].startswith('RecipeSerializer: p95'))
+
+
+class BenchmarkCommandTests(LiveServerTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # persistent connections of the server threads would outlive the
+        # test database
+        cls.conn_max_age = patch.dict(
+            connections.databases[DEFAULT_DB_ALIAS], CONN_MAX_AGE=0)
+        cls.conn_max_age.start()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.conn_max_age.stop()
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        settings = override_settings(
+            MEDIA_ROOT=self.media_root.name, IMAGE_VARIANT_WORKERS=0,
+            THROTTLE_SCALE=100)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = get_user_model().objects.create_user(
+            'bench@londonappdev.com', 'testpass')
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Rice')
+        for title in ('Curry', 'Salad'):
+            recipe = Recipe.objects.create(
+                user=self.user, title=title, time_minutes=10,
+                price=Decimal('5.00'))
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+        self.output = os.path.join(self.media_root.name, 'results.json')
+
+    def benchmark(self, **options):
+        call_command('benchmark', url=self.live_server_url,
+                     email=self.user.email, password='testpass', requests=3,
+                     concurrency=2, repeat=3, stdout=StringIO(),
+                     stderr=StringIO(), **options)
+        with open(self.output) as f:
+            return json.load(f)
+
+    def test_benchmark(self):
+        """Test every scenario and serializer is timed"""
+        results = self.benchmark(output=self.output)
+
+        self.assertEqual(len(results['http']), 8)
+        for name, summary in results['http'].items():
+            self.assertEqual(summary['errors'], 0, name)
+            self.assertGreater(summary['throughput'], 0)
+        self.assertEqual(
+            set(results['micro']),
+            {'RecipeSerializer', 'RecipeDetailSerializer'})
+        self.assertEqual(results['micro']['RecipeSerializer']['objects'], 2)
+
+    def test_benchmark_regression(self):
+        """Test a run slower than the baseline fails"""
+        baseline = os.path.join(self.media_root.name, 'baseline.json')
+        with open(baseline, 'w') as f:
+            json.dump({'micro': {'RecipeSerializer': {'p95': 0.000001}}}, f)
+
+        with self.assertRaises(CommandError):
+            self.benchmark(no_http=True, output=self.output,
+                           compare=baseline)
@@ -0,0 +1,27 @@
+from django.test import TestCase
+from core.cache import LocalMemoryResponseCache
+
+
+class LocalMemoryResponseCacheTests(TestCase):
+
+    def test_get_counts_hits_and_misses(self):
+        """Test the cache counts hits and misses"""
+        cache = LocalMemoryResponseCache()
+        cache.set('key', [1])
+
+        self.assertEqual(cache.get('key'), [1])
+        self.assertIsNone(cache.get('other'))
+        self.assertEqual(cache.stats(),
+                         {'hits': 1, 'misses': 1, 'entries': 1})
+
+    def test_evicts_least_recently_used(self):
+        """Test the least recently used entry is evicted first"""
+        cache = LocalMemoryResponseCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
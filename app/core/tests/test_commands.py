@@ -1,23 +1,242 @@
+import json
+import os
+import tempfile
+from collections import Counter
+from io import StringIO
 from unittest.mock import patch
-from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
 from django.db.utils import OperationalError
 from django.test import TestCase
+from core.models import Tag, Recipe
+
+
+WAIT_FOR_DB = 'core.management.commands.wait_for_db'
+
+
+def seed(domain, **options):
+    """Seed a small dataset, return the recipes of its users"""
+    call_command('seed_data', users=5, recipes=300, tags=20,
+                 ingredients=30, batch_size=100, domain=domain,
+                 stdout=StringIO(), **options)
+    return Recipe.objects.filter(user__email__endswith=f'@{domain}') \
+        .order_by('id')
 
 
 class CommandTests(TestCase):
 
     def test_wait_for_db_ready(self):
         """Test waiting for db until it is available """
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 1)
+        with patch(f'{WAIT_FOR_DB}.database_latency') as dl:
+            dl.return_value = 0.001
+            call_command('wait_for_db', stdout=StringIO())
+            self.assertEqual(dl.call_count, 1)
 
     # This replaces the time.sleep function with a function that returns True
     @patch('time.sleep', return_value=True)
     def test_wait_for_db(self, ts):
         """Test waiting for db"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 6)
+        with patch(f'{WAIT_FOR_DB}.database_latency') as dl:
+            dl.side_effect = [OperationalError] * 5 + [0.001]
+            call_command('wait_for_db', stdout=StringIO())
+            self.assertEqual(dl.call_count, 6)
+        # exponential backoff with jitter
+        waits = [call[0][0] for call in ts.call_args_list]
+        for attempt, wait in enumerate(waits):
+            self.assertLessEqual(wait, 0.1 * 2 ** attempt)
+
+    @patch('time.sleep', return_value=True)
+    @patch('time.monotonic')
+    def test_wait_for_db_timeout(self, tm, ts):
+        """Test waiting for db gives up after the timeout"""
+        tm.side_effect = [0, 5, 11]
+        with patch(f'{WAIT_FOR_DB}.database_latency') as dl:
+            dl.side_effect = OperationalError
+            with self.assertRaises(CommandError):
+                call_command('wait_for_db', timeout=10, stdout=StringIO())
+            self.assertEqual(dl.call_count, 2)
+
+
+class ImportRecipesCommandTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'importer@londonappdev.com', 'testpass')
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_file(self, name, content):
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_import_ndjson(self):
+        """Test importing recipes and resolving their names"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        lines = [
+            {'title': 'Curry', 'time_minutes': 30, 'price': '5.00',
+             'tags': [{'name': 'Vegan'}], 'ingredients': [{'name': 'Rice'}]},
+            {'title': 'Salad', 'time_minutes': 5, 'price': '3.50',
+             'tags': ['Vegan', 'Quick']},
+            {'title': 'Broken', 'time_minutes': 'soon', 'price': '1.00'},
+        ]
+        path = self.write_file(
+            'recipes.ndjson', '\n'.join(json.dumps(line) for line in lines))
+
+        call_command('import_recipes', path, user=self.user.email,
+                     batch_size=2, stdout=StringIO(), stderr=StringIO())
+
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 2)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        salad = recipes.get(title='Salad')
+        self.assertEqual(
+            sorted(salad.tags.values_list('name', flat=True)),
+            ['Quick', 'Vegan'])
+        self.assertTrue(
+            recipes.get(title='Curry').ingredients.filter(name='Rice'))
+
+    def test_import_skips_malformed_rows(self):
+        """Test malformed and out of range rows are skipped with COPY"""
+        path = self.write_file('recipes.ndjson', '\n'.join([
+            json.dumps({'title': 'Curry', 'time_minutes': 30,
+                        'price': '5.00'}),
+            '{"title": "Truncated", ',
+            json.dumps(['not', 'an', 'object']),
+            json.dumps({'title': 'Forever', 'time_minutes': 2 ** 40,
+                        'price': '5.00'}),
+            json.dumps({'title': 'Gold', 'time_minutes': 5,
+                        'price': '100000.00'}),
+            json.dumps({'title': 'Salad', 'time_minutes': 5,
+                        'price': '3.50'}),
+        ]))
+        stderr = StringIO()
+
+        call_command('import_recipes', path, user=self.user.email,
+                     copy=True, stdout=StringIO(), stderr=stderr)
+
+        self.assertEqual(
+            sorted(Recipe.objects.filter(
+                user=self.user).values_list('title', flat=True)),
+            ['Curry', 'Salad'])
+        self.assertEqual(stderr.getvalue().count('Skipping invalid row'), 4)
+
+    def test_import_csv_with_copy(self):
+        """Test importing a CSV file with COPY"""
+        path = self.write_file(
+            'recipes.csv',
+            'title,time_minutes,price,link,tags,ingredients\n'
+            'Pancakes,10,2.00,,Breakfast|Sweet,Flour\n'
+            '"Tab\tand, comma",5,1.00,http://x.com,,\n')
+
+        call_command('import_recipes', path, user=self.user.email,
+                     copy=True, stdout=StringIO())
+
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(
+            sorted(recipes.values_list('title', flat=True)),
+            ['Pancakes', 'Tab\tand, comma'])
+        pancakes = recipes.get(title='Pancakes')
+        self.assertEqual(pancakes.tags.count(), 2)
+        self.assertTrue(Recipe.objects.search('pancake').exists())
+
+    def test_import_resumes_from_checkpoint(self):
+        """Test the rows recorded in the checkpoint are skipped"""
+        path = self.write_file(
+            'recipes.csv',
+            'title,time_minutes,price\nFirst,1,1.00\nSecond,2,2.00\n')
+        checkpoint = self.write_file('checkpoint.json',
+                                     json.dumps({path: 1}))
+
+        call_command('import_recipes', path, user=self.user.email,
+                     checkpoint=checkpoint, stdout=StringIO())
+
+        titles = Recipe.objects.values_list('title', flat=True)
+        self.assertEqual(list(titles), ['Second'])
+        with open(checkpoint) as f:
+            self.assertEqual(json.load(f), {path: 'done'})
+
+
+class SeedDataCommandTests(TestCase):
+
+    def test_seed_data(self):
+        """Test the seeded rows follow a Zipf distribution"""
+        recipes = seed('a.example.com')
+
+        self.assertEqual(recipes.count(), 300)
+        self.assertEqual(Tag.objects.filter(
+            user__email__endswith='@a.example.com').count(), 100)
+        uses = Counter(recipes.values_list('tags__name', flat=True))
+        self.assertGreater(uses['Vegetarian'], uses['Budget'])
+        self.assertTrue(recipes.filter(ingredients__isnull=False).exists())
+        self.assertTrue(Recipe.objects.search('curry').exists())
+        self.assertTrue(
+            self.client.login(email='user0@a.example.com',
+                              password='seedpass'))
+
+    def test_seed_data_deterministic(self):
+        """Test the same seed generates the same recipes"""
+        first = seed('a.example.com', seed=7)
+        second = seed('b.example.com', seed=7)
+
+        def describe(recipes):
+            return [
+                (recipe.user.email.split('@')[0], recipe.title, recipe.price,
+                 sorted(tag.name for tag in recipe.tags.all()))
+                for recipe in recipes.select_related('user')
+                .prefetch_related('tags')
+            ]
+        self.assertEqual(describe(first), describe(second))
+
+    def test_seed_data_twice_fails(self):
+        """Test seeding the same domain again is refused"""
+        seed('a.example.com')
+
+        with self.assertRaises(CommandError):
+            seed('a.example.com')
+
+
+class ExplainQueriesCommandTests(TestCase):
+
+    def test_explain_queries(self):
+        """Test the plans of the queries of the API views are shown"""
+        seed('a.example.com')
+        out = StringIO()
+
+        call_command('explain_queries', email='user0@a.example.com',
+                     host='testserver', stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('GET /api/recipe/recipes/?tags=', output)
+        self.assertIn('GET /api/recipe/tags/?assigned_only=1', output)
+        self.assertIn('Execution Time', output)
+        self.assertIn('indexes:', output)
+
+
+class ReconcileRecipeCountsCommandTests(TestCase):
+
+    def test_reconcile_recipe_counts(self):
+        """Test the drifted recipe counts are repaired"""
+        user = get_user_model().objects.create_user(
+            'counter@londonappdev.com', 'testpass')
+        tag = Tag.objects.create(user=user, name='Vegan')
+        recipe = Recipe.objects.create(
+            user=user, title='Salad', time_minutes=5, price=5.00)
+        recipe.tags.add(tag)
+        Tag.objects.filter(id=tag.id).update(recipe_count=3)
+
+        out = StringIO()
+        call_command('reconcile_recipe_counts', dry_run=True, stdout=out)
+        self.assertIn('Found 1 wrong tag counts', out.getvalue())
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 3)
+
+        out = StringIO()
+        call_command('reconcile_recipe_counts', batch_size=1, stdout=out)
+        self.assertIn('Fixed 1 wrong tag counts', out.getvalue())
+        self.assertIn('Fixed 0 wrong ingredient counts', out.getvalue())
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
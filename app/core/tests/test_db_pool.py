@@ -0,0 +1,90 @@
+import threading
+from unittest.mock import patch
+import psycopg2
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.utils import OperationalError
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.db.pool import ConnectionPool
+
+
+class ConnectionPoolTests(TransactionTestCase):
+
+    def setUp(self):
+        params = connection.get_connection_params()
+        self.pool = ConnectionPool(
+            lambda: psycopg2.connect(**params), max_size=2, timeout=0.1,
+            check_interval=0)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_connections_are_reused(self):
+        """Test a connection given back is handed out again"""
+        conn = self.pool.checkout()
+        self.pool.checkin(conn)
+
+        self.assertIs(self.pool.checkout(), conn)
+        self.assertEqual(self.pool.stats()['created'], 1)
+        self.assertEqual(self.pool.stats()['in_use'], 1)
+
+    def test_open_transaction_is_rolled_back(self):
+        """Test a connection comes back without a transaction"""
+        conn = self.pool.checkout()
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.pool.checkin(conn)
+
+        self.assertEqual(conn.get_transaction_status(),
+                         psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+    def test_dead_connection_is_replaced(self):
+        """Test the health check discards a terminated connection"""
+        conn = self.pool.checkout()
+        self.pool.checkin(conn)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)',
+                           [conn.get_backend_pid()])
+
+        new_conn = self.pool.checkout()
+
+        self.assertIsNot(new_conn, conn)
+        self.assertEqual(self.pool.stats()['discarded'], 1)
+        self.pool.checkin(new_conn)
+
+    def test_checkout_waits_for_a_connection(self):
+        """Test the pool is bounded, checkouts time out when exhausted"""
+        conns = [self.pool.checkout(), self.pool.checkout()]
+        with self.assertRaises(OperationalError):
+            self.pool.checkout()
+
+        timer = threading.Timer(0.02, self.pool.checkin, [conns.pop()])
+        self.pool.timeout = 5
+        timer.start()
+        conns.append(self.pool.checkout())
+        timer.join()
+
+        self.assertGreater(self.pool.stats()['max_wait_time'], 0)
+        for conn in conns:
+            self.pool.checkin(conn)
+        self.assertEqual(self.pool.stats()['idle'], 2)
+
+
+class PoolMetricsApiTests(TestCase):
+
+    def test_metrics_require_staff(self):
+        """Test only the staff can read the pool metrics"""
+        url = reverse('db-pool-metrics')
+        client = APIClient()
+        user = get_user_model().objects.create_user('u@x.com', 'testpass')
+        client.force_authenticate(user)
+        res = client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        user.is_staff = True
+        with patch('core.views.pool_stats', return_value={'default': []}):
+            res = client.get(url)
+        self.assertEqual(res.data, {'default': []})
@@ -0,0 +1,61 @@
+from unittest.mock import patch
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from core import health
+
+
+HEALTHZ_URL = reverse('healthz')
+READYZ_URL = reverse('readyz')
+
+
+class HealthApiTests(TestCase):
+
+    def test_healthz(self):
+        """Test the liveness probe reports the database latency"""
+        res = self.client.get(HEALTHZ_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['database'], 'ok')
+        self.assertIn('database_latency', res.json())
+        self.assertIn('no-cache', res['Cache-Control'])
+
+    def test_healthz_database_down(self):
+        """Test the probes fail when the database is unreachable"""
+        error = OperationalError('could not connect to server db:5432')
+        with patch('core.views.database_latency', side_effect=error):
+            with self.assertLogs('core.views', 'ERROR'):
+                res = self.client.get(HEALTHZ_URL)
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json(), {'database': 'unavailable'})
+        self.assertNotIn('db:5432', res.content.decode())
+
+    @override_settings(HEALTH_DB_LATENCY_LIMIT=0.1)
+    def test_slow_database(self):
+        """Test the probes fail when the database answers slowly"""
+        with patch('core.views.database_latency', return_value=0.2):
+            res = self.client.get(READYZ_URL)
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()['database'], 'slow')
+
+    def test_readyz(self):
+        """Test the readiness probe checks the migrations"""
+        res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['migrations'], 'ok')
+
+    def test_readyz_pending_migrations(self):
+        """Test an instance with pending migrations is not ready"""
+        with patch('core.views.pending_migrations',
+                   return_value=['core.0099_next']):
+            res = self.client.get(READYZ_URL)
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()['pending_migrations'],
+                         ['core.0099_next'])
+
+    def test_pending_migrations(self):
+        """Test the migrations of the test database are all applied"""
+        health._migrated.discard('default')
+        self.assertEqual(health.pending_migrations(), [])
+        self.assertIn('default', health._migrated)
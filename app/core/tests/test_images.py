@@ -0,0 +1,39 @@
+import os
+import tempfile
+from django.test import TestCase
+from PIL import Image
+from core import images
+
+
+class ImageVariantTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.name = 'uploads/recipe/photo.png'
+        path = os.path.join(self.media_root.name, self.name)
+        os.makedirs(os.path.dirname(path))
+        Image.new('RGBA', (1200, 800)).save(path, 'PNG')
+
+    def tearDown(self):
+        self.media_root.cleanup()
+
+    def test_variant_name(self):
+        """Test variants are stored next to the image"""
+        self.assertEqual(
+            images.variant_name(self.name, 'thumbnail'),
+            'uploads/recipe/variants/photo_thumbnail.jpg')
+
+    def test_build_variants(self):
+        """Test every variant fits its bounding box"""
+        names = images.build_variants(self.media_root.name, self.name)
+
+        for variant, (size, _, _) in images.IMAGE_VARIANTS.items():
+            if variant not in names:
+                # the format is not supported by this Pillow build
+                continue
+            path = os.path.join(self.media_root.name, names[variant])
+            with Image.open(path) as image:
+                self.assertEqual(image.size[0], size[0])
+                self.assertLessEqual(image.size[1], size[1])
+        self.assertIn('thumbnail', names)
+        self.assertIn('medium', names)
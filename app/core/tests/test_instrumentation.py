@@ -0,0 +1,73 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.instrumentation import Histogram, registry
+from core.models import Tag
+from core.testing import QueryBudgetMixin
+
+
+TAGS_URL = reverse('recipe:tag-list')
+METRICS_URL = reverse('request-metrics')
+
+
+class InstrumentationTests(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        registry.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing_header(self):
+        """Test the responses carry their database and serializer time"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertRegex(
+            res['Server-Timing'],
+            r'^db;dur=[\d.]+;desc="\d+ queries", '
+            r'serializer;dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_histograms_per_view_and_action(self):
+        """Test the metrics are aggregated by viewset action"""
+        self.client.get(TAGS_URL)
+        self.client.get(TAGS_URL, {'assigned_only': 1})
+        self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        tag_list = res.data['recipe.views.TagViewSet.list']
+        self.assertEqual(tag_list['queries']['count'], 2)
+        self.assertGreater(tag_list['queries']['sum'], 0)
+        self.assertEqual(
+            res.data['recipe.views.TagViewSet.create']['total_time']['count'],
+            1)
+
+    def test_histogram(self):
+        """Test the values are counted in the bucket of their bound"""
+        histogram = Histogram((1, 5))
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.as_dict(), {
+            'buckets': {'1': 2, '5': 1, '+Inf': 1},
+            'count': 4,
+            'sum': 14.5,
+        })
+
+    def test_query_budget_exceeded(self):
+        """Test the query budget helper fails on extra queries"""
+        with self.assertRaises(AssertionError) as cm:
+            with self.assertMaxQueries(1):
+                list(Tag.objects.all())
+                list(Tag.objects.all())
+        self.assertIn('2 queries executed, the budget is 1',
+                      str(cm.exception))
+
+        with self.assertMaxQueries(1):
+            list(Tag.objects.all())
@@ -1,4 +1,3 @@
-from unittest.mock import patch
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
@@ -74,11 +73,101 @@ class ModelTests(TestCase):
         )
         self.assertEqual(str(recipe), recipe.title)
 
-    @patch('uuid.uuid4')
-    def test_recipe_file_name_uuid(self, mock_uuid):
+    def test_recipe_file_name(self):
         """Test that image is saved in the correct location"""
-        uuid = 'test-uuid'
-        mock_uuid.return_value = uuid
         file_path = models.recipe_image_file_path(None, 'my_image.jpg')
-        exp_path = f'uploads/recipe/{uuid}.jpg'
+        exp_path = 'uploads/recipe/image.jpg'
         self.assertEqual(file_path, exp_path)
+
+
+class RecipeCountTests(TestCase):
+
+    def setUp(self):
+        self.user = sample_user()
+        self.vegan = models.Tag.objects.create(user=self.user, name='Vegan')
+        self.quick = models.Tag.objects.create(user=self.user, name='Quick')
+        self.recipes = [
+            models.Recipe.objects.create(
+                user=self.user, title=title, time_minutes=5, price=5.00)
+            for title in ('Salad', 'Soup')
+        ]
+
+    def assertCounts(self, vegan, quick):
+        self.vegan.refresh_from_db()
+        self.quick.refresh_from_db()
+        self.assertEqual(
+            (self.vegan.recipe_count, self.quick.recipe_count),
+            (vegan, quick))
+
+    def test_count_links_of_recipe(self):
+        """Test the counts follow the tags added to and removed from recipes"""
+        salad, soup = self.recipes
+        salad.tags.add(self.vegan, self.quick)
+        soup.tags.add(self.vegan)
+        soup.tags.add(self.vegan)
+        self.assertCounts(2, 1)
+
+        # the quick tag is not linked to the soup
+        soup.tags.remove(self.vegan, self.quick)
+        self.assertCounts(1, 1)
+
+        salad.tags.clear()
+        self.assertCounts(0, 0)
+
+    def test_count_links_of_tag(self):
+        """Test the counts follow the recipes added to and removed from tags"""
+        salad, soup = self.recipes
+        self.vegan.recipe_set.add(salad, soup)
+        self.assertCounts(2, 0)
+
+        self.vegan.recipe_set.remove(salad)
+        self.vegan.recipe_set.remove(salad)
+        self.assertCounts(1, 0)
+
+        self.vegan.recipe_set.clear()
+        self.assertCounts(0, 0)
+
+    def test_count_deleted_recipe(self):
+        """Test a deleted recipe is no longer counted"""
+        salad, soup = self.recipes
+        salad.tags.add(self.vegan, self.quick)
+        soup.tags.add(self.vegan)
+
+        salad.delete()
+
+        self.assertCounts(1, 0)
+
+    def test_count_bulk_links(self):
+        """Test the links inserted and removed in bulk are counted"""
+        salad, soup = self.recipes
+        models.Recipe.objects.add_links('tags', [
+            (salad.id, self.vegan.id), (soup.id, self.vegan.id),
+            (soup.id, self.quick.id)])
+        self.assertCounts(2, 1)
+
+        models.Recipe.objects.filter(id=soup.id).remove_links('tags')
+
+        self.assertCounts(1, 0)
+        self.assertFalse(soup.tags.exists())
+
+    def test_count_drift_logged(self):
+        """Test a count going below zero is logged and left at zero"""
+        salad, soup = self.recipes
+        salad.tags.add(self.vegan, self.quick)
+        models.Tag.objects.filter(id=self.vegan.id).update(recipe_count=0)
+
+        with self.assertLogs('core.models', 'WARNING'):
+            salad.tags.clear()
+
+        self.assertCounts(0, 0)
+
+    def test_update_recipe_count(self):
+        """Test the wrong counts are counted again"""
+        self.recipes[0].tags.add(self.vegan)
+        models.Tag.objects.filter(id=self.vegan.id).update(recipe_count=5)
+        models.Tag.objects.filter(id=self.quick.id).update(recipe_count=2)
+
+        fixed = models.Tag.objects.update_recipe_count()
+
+        self.assertEqual(fixed, 2)
+        self.assertCounts(1, 0)
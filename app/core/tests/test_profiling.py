@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from core.profiling import StackSampler, load_profiles, read_stacks, \
+    save_profile
+
+
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir)
+        settings = override_settings(
+            PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0,
+            PROFILING_INTERVAL=0.001, PROFILING_DIR=self.profile_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass')
+        # the middleware authenticates the token before the view
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_sampler_collapsed_stacks(self):
+        """Test the sampler counts the stacks of the sampled thread"""
+        sampler = StackSampler(interval=0.001)
+        sampler.start()
+        busy_loop(0.05)
+        sampler.stop()
+
+        self.assertGreater(sampler.samples, 0)
+        lines = sampler.collapsed().splitlines()
+        self.assertTrue(any('test_profiling.busy_loop' in line
+                            for line in lines))
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit()
+                            for line in lines))
+
+    def test_staff_profiles_request(self):
+        """Test a staff user gets a profile of the request asked for"""
+        self.user.is_staff = True
+        self.user.save()
+
+        res = self.client.get(TAGS_URL, HTTP_X_PROFILE='1')
+
+        profiles = load_profiles()
+        self.assertEqual(len(profiles), 1)
+        self.assertEqual(res['X-Profile-Id'], profiles[0]['id'])
+        self.assertEqual(profiles[0]['path'], TAGS_URL)
+        self.assertEqual(profiles[0]['view'], 'recipe.views.TagViewSet.list')
+        self.assertTrue(os.path.exists(os.path.join(
+            self.profile_dir, f"{profiles[0]['id']}.collapsed")))
+
+    def test_other_users_not_profiled(self):
+        """Test the profile header of a user not staff is ignored"""
+        with patch('core.middleware.StackSampler') as sampler:
+            res = self.client.get(TAGS_URL, HTTP_X_PROFILE='1')
+            APIClient().get(TAGS_URL, HTTP_X_PROFILE='1')
+            APIClient().get(TAGS_URL, HTTP_X_PROFILE='1',
+                            HTTP_AUTHORIZATION='Token invalid')
+
+        sampler.assert_not_called()
+        self.assertNotIn('X-Profile-Id', res)
+        self.assertEqual(load_profiles(), [])
+
+    def test_sampled_requests_profiled(self):
+        """Test a sample of all the requests is profiled"""
+        with self.settings(PROFILING_SAMPLE_RATE=1):
+            res = self.client.get(TAGS_URL)
+
+        self.assertNotIn('X-Profile-Id', res)
+        self.assertEqual(len(load_profiles()), 1)
+
+    def test_disabled_middleware_not_used(self):
+        """Test no request is profiled when profiling is disabled"""
+        self.user.is_staff = True
+        self.user.save()
+
+        with self.settings(PROFILING_ENABLED=False, PROFILING_SAMPLE_RATE=1):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            res = client.get(TAGS_URL, HTTP_X_PROFILE='1')
+
+        self.assertNotIn('X-Profile-Id', res)
+        self.assertEqual(load_profiles(), [])
+
+    def test_profiles_command(self):
+        """Test the profiles are listed and their stacks merged"""
+        started = time.time()
+        for i, stacks in enumerate(({'a;b': 3, 'a;c': 1}, {'a;b': 2})):
+            sampler = StackSampler()
+            sampler.stacks.update(stacks)
+            save_profile(sampler, method='GET', path='/api/recipe/tags/',
+                         view='recipe.views.TagViewSet.list', status=200,
+                         duration=12.5, created=started + i)
+        profile_id = load_profiles()[0]['id']
+        self.assertEqual(read_stacks(profile_id), {'a;b': 3, 'a;c': 1})
+
+        out = StringIO()
+        call_command('profiles', stdout=out)
+        self.assertEqual(out.getvalue().count('/api/recipe/tags/'), 2)
+
+        out = StringIO()
+        call_command('profiles', '--aggregate', '--top', '1', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[:2], ['a;b 5', 'a;c 1'])
+        self.assertIn('Own samples', lines)
+        self.assertIn('       5   83.3%  b', lines)
+        self.assertIn('       6  100.0%  a', lines)
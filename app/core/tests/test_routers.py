@@ -0,0 +1,108 @@
+import tempfile
+from unittest.mock import MagicMock, patch
+from django.core.exceptions import ImproperlyConfigured
+from django.db.utils import OperationalError
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework.response import Response
+from core.db import routers
+from core.middleware import ReplicaMiddleware
+from core.models import Recipe
+
+
+@override_settings(REPLICA_DATABASES=['replica1'])
+class ReplicaRoutingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.pin_dir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+            'pins': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': self.pin_dir.name,
+            },
+        }, REPLICA_PIN_CACHE='pins')
+        self.settings.enable()
+        routers._down_until.clear()
+        patcher = patch('core.db.routers.connections')
+        self.connections = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+        self.router = routers.ReplicaRouter()
+
+    def tearDown(self):
+        self.settings.disable()
+        self.pin_dir.cleanup()
+
+    def read_database(self, request):
+        """Return the database the reads of the request go to"""
+        used = []
+
+        def view(request):
+            used.append(self.router.db_for_read(Recipe))
+            return HttpResponse()
+
+        ReplicaMiddleware(view)(request)
+        return used[0]
+
+    def test_safe_requests_read_from_replica(self):
+        """Test the reads of a GET go to the replica"""
+        request = self.factory.get('/', HTTP_AUTHORIZATION='Token a')
+        self.assertEqual(self.read_database(request), 'replica1')
+        self.assertIsNone(routers.get_read_database())
+        self.assertEqual(self.router.db_for_write(Recipe), 'default')
+
+    def test_writes_pin_to_primary(self):
+        """Test a client reads its own writes from the primary"""
+        post = self.factory.post('/', HTTP_AUTHORIZATION='Token a')
+        self.assertIsNone(self.read_database(post))
+
+        get = self.factory.get('/', HTTP_AUTHORIZATION='Token a')
+        self.assertIsNone(self.read_database(get))
+        other = self.factory.get('/', HTTP_AUTHORIZATION='Token b')
+        self.assertEqual(self.read_database(other), 'replica1')
+
+    def test_login_pins_issued_token(self):
+        """Test a client reads from the primary with the token it got"""
+        login = Response({'token': 'new'})
+        ReplicaMiddleware(lambda request: login)(
+            self.factory.post('/api/user/token/'))
+
+        get = self.factory.get('/', HTTP_AUTHORIZATION='Token new')
+        self.assertIsNone(self.read_database(get))
+        other = self.factory.get('/', HTTP_AUTHORIZATION='Token old')
+        self.assertEqual(self.read_database(other), 'replica1')
+
+    def test_failover_to_primary(self):
+        """Test an unreachable replica is skipped for a while"""
+        self.connections.__getitem__.return_value = MagicMock(
+            ensure_connection=MagicMock(side_effect=OperationalError))
+
+        self.assertIsNone(self.read_database(self.factory.get('/')))
+        self.assertIsNone(self.read_database(self.factory.get('/')))
+        self.assertEqual(
+            self.connections['replica1'].ensure_connection.call_count, 1)
+
+    def test_failed_query_marks_replica_down(self):
+        """Test a replica failing during a request is left out"""
+        middleware = ReplicaMiddleware(lambda request: HttpResponse())
+        routers.set_read_database('replica1')
+        middleware.process_exception(self.factory.get('/'),
+                                     OperationalError())
+        routers.set_read_database(None)
+
+        self.assertIsNone(routers.choose_replica())
+
+    def test_local_pin_cache_refused(self):
+        """Test the pins can not be kept in the memory of one process"""
+        with override_settings(REPLICA_PIN_CACHE='default'):
+            with self.assertRaises(ImproperlyConfigured):
+                ReplicaMiddleware(lambda request: HttpResponse())
+
+    def test_replicas_are_not_migrated(self):
+        """Test only the primary is migrated"""
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'core'))
@@ -0,0 +1,99 @@
+import os
+import tempfile
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.test import RequestFactory, TransactionTestCase, \
+    override_settings
+from django.contrib.auth import get_user_model
+from PIL import Image
+from core.models import ImageFile, Recipe
+from core.storage import is_content_addressed
+from core.views import serve_media
+
+
+def image_content(color):
+    f = BytesIO()
+    Image.new('RGB', (16, 16), color).save(f, format='PNG')
+    return ContentFile(f.getvalue())
+
+
+class ContentAddressedStorageTests(TransactionTestCase):
+    """The files are deleted on commit, so the tests commit"""
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings = override_settings(
+            MEDIA_ROOT=self.media_root.name, IMAGE_VARIANT_WORKERS=0)
+        self.settings.enable()
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass')
+
+    def tearDown(self):
+        self.settings.disable()
+        self.media_root.cleanup()
+
+    def sample_recipe(self, color='red'):
+        recipe = Recipe.objects.create(
+            user=self.user, title='Sample recipe', time_minutes=10, price=5)
+        recipe.image.save('photo.PNG', image_content(color))
+        return Recipe.objects.get(pk=recipe.pk)
+
+    def refcount(self, name):
+        image = ImageFile.objects.filter(name=name).first()
+        return image.refcount if image else 0
+
+    def test_identical_images_are_stored_once(self):
+        """Test recipes with the same image share its file"""
+        recipe1 = self.sample_recipe()
+        recipe2 = self.sample_recipe()
+
+        self.assertEqual(recipe1.image.name, recipe2.image.name)
+        self.assertRegex(recipe1.image.name,
+                         r'^uploads/recipe/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertTrue(is_content_addressed(recipe1.image.name))
+        self.assertEqual(self.refcount(recipe1.image.name), 2)
+
+    def test_delete_recipe_releases_image(self):
+        """Test the file is deleted with its last recipe"""
+        recipe1 = self.sample_recipe()
+        recipe2 = self.sample_recipe()
+        path = recipe1.image.path
+
+        recipe1.delete()
+        self.assertTrue(os.path.exists(path))
+        Recipe.objects.filter(pk=recipe2.pk).delete()
+
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(ImageFile.objects.exists())
+
+    def test_replace_image_releases_previous(self):
+        """Test replacing an image deletes the previous file"""
+        recipe = self.sample_recipe('red')
+        path = recipe.image.path
+
+        recipe.image.save('photo.png', image_content('blue'))
+
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(os.path.exists(recipe.image.path))
+        self.assertEqual(self.refcount(recipe.image.name), 1)
+
+    def test_store_same_image_again(self):
+        """Test storing the image a recipe has keeps one reference"""
+        recipe = self.sample_recipe()
+
+        recipe.image.save('photo.png', image_content('red'))
+
+        self.assertTrue(os.path.exists(recipe.image.path))
+        self.assertEqual(self.refcount(recipe.image.name), 1)
+
+    def test_serve_immutable_media(self):
+        """Test content addressed files are cached for a year"""
+        recipe = self.sample_recipe()
+        request = RequestFactory().get('/media/')
+
+        res = serve_media(request, recipe.image.name)
+
+        self.assertIn('immutable', res['Cache-Control'])
+        self.assertIn('max-age=31536000', res['Cache-Control'])
+        list(res.streaming_content)
+        res.close()
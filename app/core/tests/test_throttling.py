@@ -0,0 +1,95 @@
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.throttling import ConcurrencyLimit
+from user.views import CreateTokenView
+
+
+TOKEN_URL = reverse('user:token')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+@override_settings(THROTTLE_BUCKETS={
+    'auth': {'capacity': 2, 'per_minute': 1},
+    'read': {'capacity': 3, 'per_minute': 1},
+    'write': {'capacity': 1, 'per_minute': 1},
+})
+class ThrottlingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass')
+
+    def tearDown(self):
+        cache.clear()
+
+    def login(self, email='test@londonappdev.com', **extra):
+        return self.client.post(
+            TOKEN_URL, {'email': email, 'password': 'testpass'}, **extra)
+
+    def test_login_flood_is_throttled(self):
+        """Test the logins over the budget get 429 and Retry-After"""
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+
+        res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '60')
+
+    def test_login_throttled_per_account(self):
+        """Test one account is throttled whatever the IP"""
+        self.login(REMOTE_ADDR='10.0.0.1')
+        self.login(REMOTE_ADDR='10.0.0.2')
+
+        res = self.login(REMOTE_ADDR='10.0.0.3')
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        res = self.login(email='other@londonappdev.com',
+                         REMOTE_ADDR='10.0.0.4')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_login_ignores_forwarded_for(self):
+        """Test a client can not change its IP with X-Forwarded-For"""
+        for number in range(2):
+            self.login(email=f'user{number}@londonappdev.com',
+                       HTTP_X_FORWARDED_FOR=f'10.0.0.{number}')
+
+        res = self.login(email='user2@londonappdev.com',
+                         HTTP_X_FORWARDED_FOR='10.0.0.2')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_login_list_body(self):
+        """Test a login with a list body is not counted per account"""
+        res = self.client.post(TOKEN_URL, [], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_writes_do_not_use_the_read_budget(self):
+        """Test reads are still served once the writes are throttled"""
+        self.client.force_authenticate(self.user)
+        payload = {'title': 'Cake', 'time_minutes': 5, 'price': 1}
+        res = self.client.post(RECIPES_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = self.client.post(RECIPES_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', res)
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_password_checks_are_shed(self):
+        """Test logins over the concurrency limit get 503"""
+        limit = ConcurrencyLimit(1)
+        with patch.object(CreateTokenView, 'password_checks', limit):
+            with limit:
+                res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '1')
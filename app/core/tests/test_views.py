@@ -0,0 +1,119 @@
+import os
+import tempfile
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.utils.http import http_date
+from core.views import parse_range, serve_media
+
+
+class ParseRangeTests(SimpleTestCase):
+
+    def test_parse_range(self):
+        """Test the single byte ranges are parsed"""
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=90-200', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertIsNone(parse_range(None, 100))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 100))
+
+    def test_unsatisfiable_range(self):
+        """Test ranges outside of the file raise ValueError"""
+        for header in ('bytes=100-', 'bytes=-0', 'bytes=5-1'):
+            with self.assertRaises(ValueError):
+                parse_range(header, 100)
+
+
+class ServeMediaTests(SimpleTestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings = override_settings(
+            MEDIA_ROOT=self.media_root.name, MEDIA_SERVE='file')
+        self.settings.enable()
+        self.content = bytes(range(256)) * 4
+        with open(os.path.join(self.media_root.name, 'photo.jpg'), 'wb') as f:
+            f.write(self.content)
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        self.settings.disable()
+        self.media_root.cleanup()
+
+    def get(self, path='photo.jpg', **headers):
+        res = serve_media(self.factory.get(f'/media/{path}', **headers), path)
+        content = b''.join(res.streaming_content) \
+            if res.streaming else res.content
+        res.close()
+        return res, content
+
+    def test_serve_file(self):
+        """Test the whole file is served with its validators"""
+        res, content = self.get()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(content, self.content)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', res)
+        self.assertIn('Last-Modified', res)
+
+    def test_not_found(self):
+        """Test missing files and paths outside MEDIA_ROOT are not found"""
+        for path in ('missing.jpg', '../etc/passwd', ''):
+            with self.assertRaises(Http404):
+                serve_media(self.factory.get('/media/'), path)
+
+    def test_range(self):
+        """Test a byte range is served with 206"""
+        res, content = self.get(HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(content, self.content[10:20])
+        self.assertEqual(res['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(res['Content-Length'], '10')
+
+    def test_unsatisfiable_range(self):
+        """Test a range after the end of the file is refused"""
+        res, _ = self.get(HTTP_RANGE='bytes=2000-')
+
+        self.assertEqual(res.status_code, 416)
+        self.assertEqual(res['Content-Range'], 'bytes */1024')
+
+    def test_if_range(self):
+        """Test an outdated If-Range sends the whole file"""
+        res, _ = self.get()
+        etag = res['ETag']
+
+        res, _ = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(res.status_code, 206)
+        res, content = self.get(HTTP_RANGE='bytes=0-9',
+                                HTTP_IF_RANGE='"outdated"')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(content, self.content)
+
+    def test_not_modified(self):
+        """Test conditional requests of an unchanged file get 304"""
+        res, _ = self.get()
+
+        res, _ = self.get(HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, 304)
+        res, _ = self.get(HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(res.status_code, 304)
+
+    def test_x_accel_redirect(self):
+        """Test nginx is asked to send the file"""
+        with override_settings(MEDIA_SERVE='x-accel-redirect'):
+            res, content = self.get()
+
+        self.assertEqual(res['X-Accel-Redirect'],
+                         '/protected-media/photo.jpg')
+        self.assertEqual(content, b'')
+
+    def test_x_sendfile(self):
+        """Test the front server is given the path of the file"""
+        with override_settings(MEDIA_SERVE='x-sendfile'):
+            res, _ = self.get()
+
+        self.assertEqual(res['X-Sendfile'],
+                         os.path.join(self.media_root.name, 'photo.jpg'))
@@ -0,0 +1,99 @@
+import hashlib
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+
+class Overloaded(APIException):
+    status_code = 503
+    default_detail = 'The server is busy, try again later.'
+    default_code = 'overloaded'
+    # sent as Retry-After by the exception handler
+    wait = 1
+
+
+class ConcurrencyLimit:
+    """Refuse the calls over a number running at once in the process"""
+
+    def __init__(self, limit):
+        self._semaphore = threading.BoundedSemaphore(limit)
+
+    def __enter__(self):
+        if not self._semaphore.acquire(blocking=False):
+            raise Overloaded()
+
+    def __exit__(self, *exc_info):
+        self._semaphore.release()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle with token buckets stored in the THROTTLE_CACHE
+
+    A bucket holds up to `capacity` requests and gets `per_minute` of
+    them back every minute, allowing bursts but not floods. A request
+    takes a token from every bucket it belongs to.
+    """
+    scope = None
+
+    def get_scope(self, request, view):
+        return self.scope
+
+    def get_buckets(self, request, view):
+        """Return the identities the request is counted against"""
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request, view)
+        config = settings.THROTTLE_BUCKETS[scope]
+        capacity = config['capacity'] * settings.THROTTLE_SCALE
+        rate = config['per_minute'] * settings.THROTTLE_SCALE / 60
+        cache = caches[settings.THROTTLE_CACHE]
+        now = time.time()
+
+        keys = [f'throttle:{scope}:{ident}'
+                for ident in self.get_buckets(request, view)]
+        buckets = {}
+        for key, (tokens, updated) in cache.get_many(keys).items():
+            buckets[key] = min(capacity, tokens + (now - updated) * rate)
+        empty = [tokens for tokens in buckets.values() if tokens < 1]
+        if empty:
+            self.wait_time = (1 - min(empty)) / rate
+            return False
+
+        cache.set_many({
+            key: (buckets.get(key, capacity) - 1, now) for key in keys
+        }, timeout=int(capacity / rate) + 1)
+        return True
+
+    def wait(self):
+        return self.wait_time
+
+
+class AuthThrottle(TokenBucketThrottle):
+    """Throttle the password checks per IP and per account"""
+    scope = 'auth'
+
+    def get_buckets(self, request, view):
+        buckets = [f'ip:{self.get_ident(request)}']
+        data = request.data
+        email = data.get('email') if isinstance(data, dict) else None
+        if isinstance(email, str) and email:
+            digest = hashlib.md5(email.lower().encode('utf-8')).hexdigest()
+            buckets.append(f'email:{digest}')
+        return buckets
+
+
+class ReadWriteThrottle(TokenBucketThrottle):
+    """Throttle reads and writes with separate budgets per user"""
+
+    def get_scope(self, request, view):
+        return 'read' if request.method in SAFE_METHODS else 'write'
+
+    def get_buckets(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return [f'user:{request.user.pk}']
+        return [f'ip:{self.get_ident(request)}']
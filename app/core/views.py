@@ -0,0 +1,194 @@
+import logging
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import DatabaseError
+from django.http import FileResponse, Http404, HttpResponse, \
+    JsonResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_safe
+from rest_framework.decorators import api_view, authentication_classes, \
+    permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from core.authentication import CachedTokenAuthentication
+from core.db.pool import pool_stats
+from core.health import database_latency, pending_migrations
+from core.instrumentation import registry
+from core.storage import is_content_addressed
+
+
+logger = logging.getLogger(__name__)
+
+
+# a content addressed file never changes, it is cached for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """Return the first and last byte of a Range header
+
+    None means the whole file is sent: there is no header, or it asks for
+    several ranges. An unsatisfiable range raises ValueError.
+    """
+    match = RANGE.match(header or '')
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        # the last bytes of the file
+        if not last or not int(last) or not size:
+            raise ValueError
+        return max(size - int(last), 0), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first > last:
+        raise ValueError
+    return first, last
+
+
+def read_range(path, first, length):
+    """Yield the bytes of a range of the file, in chunks"""
+    with open(path, 'rb') as f:
+        f.seek(first)
+        while length > 0:
+            data = f.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def _file_response(request, path, full_path, size, etag, last_modified):
+    content_type = mimetypes.guess_type(full_path)[0] or \
+        'application/octet-stream'
+    mode = settings.MEDIA_SERVE
+    if mode == 'x-accel-redirect':
+        # nginx serves the internal location, Range requests included
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(
+            settings.MEDIA_ACCEL_REDIRECT_LOCATION + path)
+        return response
+    if mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+        return response
+
+    byte_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range or if_range in (etag, http_date(last_modified)):
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+        except ValueError:
+            response = HttpResponse(
+                status=416, content_type=content_type)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = size
+    elif byte_range is None:
+        # the WSGI server sends the file with sendfile() when it can
+        response = FileResponse(
+            open(full_path, 'rb'), content_type=content_type)
+        response['Content-Length'] = size
+    else:
+        first, last = byte_range
+        response = StreamingHttpResponse(
+            read_range(full_path, first, last - first + 1),
+            status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+        response['Content-Length'] = last - first + 1
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve a media file, answering conditional and Range requests
+
+    MEDIA_SERVE chooses who sends the bytes: the WSGI server with
+    'file', the front server with 'x-accel-redirect' or 'x-sendfile'.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        file_stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise Http404
+
+    etag = quote_etag(f'{file_stat.st_mtime_ns:x}-{file_stat.st_size:x}')
+    last_modified = int(file_stat.st_mtime)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _file_response(request, path, full_path,
+                                  file_stat.st_size, etag, last_modified)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    if is_content_addressed(path):
+        patch_cache_control(response, public=True, immutable=True,
+                            max_age=IMMUTABLE_MAX_AGE)
+    return response
+
+
+@api_view(['GET'])
+@authentication_classes((CachedTokenAuthentication,))
+@permission_classes((IsAdminUser,))
+def db_pool_metrics(request):
+    """Return the connections in use, idle and the waits of each pool"""
+    return Response(pool_stats())
+
+
+@api_view(['GET'])
+@authentication_classes((CachedTokenAuthentication,))
+@permission_classes((IsAdminUser,))
+def request_metrics(request):
+    """Return the histograms of the queries and times of each view"""
+    return Response(registry.snapshot())
+
+
+def _database_check():
+    """Return the status code and the report of the database latency"""
+    try:
+        latency = database_latency()
+    except DatabaseError:
+        # the error names hosts and databases, the probes are public
+        logger.exception('Health check could not reach the database')
+        return 503, {'database': 'unavailable'}
+    status = 200 if latency <= settings.HEALTH_DB_LATENCY_LIMIT else 503
+    return status, {'database': 'ok' if status == 200 else 'slow',
+                    'database_latency': round(latency, 6)}
+
+
+@never_cache
+@require_safe
+def healthz(request):
+    """Liveness probe: the process answers and reaches the database"""
+    status, report = _database_check()
+    return JsonResponse(report, status=status)
+
+
+@never_cache
+@require_safe
+def readyz(request):
+    """Readiness probe: the database is fast and fully migrated"""
+    status, report = _database_check()
+    if status == 200:
+        pending = pending_migrations()
+        report['migrations'] = 'pending' if pending else 'ok'
+        if pending:
+            status = 503
+            report['pending_migrations'] = pending
+    return JsonResponse(report, status=status)
@@ -0,0 +1,129 @@
+from django.db import transaction
+from django.db.models import F
+from core.models import Tag, Ingredient, Recipe
+from core.signals import recipes_uncounted
+from recipe.serializers import RecipeBulkSerializer
+
+
+BATCH_SIZE = 1000
+LINK_FIELDS = ('tags', 'ingredients')
+
+
+def is_id(value):
+    """Return whether a JSON value is an id, a bool is an int in Python"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _validate(user, items, instances=None):
+    """Validate every item, return the valid data and the error per item
+
+    The tags and ingredients of the user are loaded once, instead of one
+    query per related id and item.
+    """
+    context = {
+        'tag_ids': set(
+            Tag.objects.filter(user=user).values_list('id', flat=True)),
+        'ingredient_ids': set(
+            Ingredient.objects.filter(user=user).values_list('id', flat=True)),
+    }
+    valid, errors, seen = [], {}, set()
+    for index, item in enumerate(items):
+        instance = None
+        if instances is not None:
+            pk = item.get('id') if isinstance(item, dict) else None
+            instance = instances.get(pk) if is_id(pk) else None
+            if instance is None:
+                errors[index] = {'id': ['Recipe not found.']}
+                continue
+            # the links of a recipe are replaced once per batch
+            if pk in seen:
+                errors[index] = {'id': ['Duplicate id in batch.']}
+                continue
+            seen.add(pk)
+        serializer = RecipeBulkSerializer(
+            instance, data=item, partial=instance is not None,
+            context=context)
+        if serializer.is_valid():
+            valid.append((index, instance, serializer.validated_data))
+        else:
+            errors[index] = serializer.errors
+    return valid, errors
+
+
+def _results(count, done, errors):
+    """Return one result per item: its id or its errors"""
+    return [
+        {'errors': errors[index]} if index in errors else {'id': done[index]}
+        for index in range(count)
+    ]
+
+
+def _link(recipe_links):
+    """Insert the through table rows of the recipes in batches"""
+    for field in LINK_FIELDS:
+        Recipe.objects.add_links(field, [
+            (recipe_id, related_id)
+            for recipe_id, links in recipe_links
+            for related_id in set(links.get(field, ()))
+        ], batch_size=BATCH_SIZE)
+
+
+def bulk_create_recipes(user, items):
+    """Create the valid recipes of the items in one transaction"""
+    valid, errors = _validate(user, items)
+    links = [
+        {field: data.pop(field, []) for field in LINK_FIELDS}
+        for _, _, data in valid
+    ]
+    with transaction.atomic():
+        recipes = Recipe.objects.bulk_create(
+            [Recipe(user=user, **data) for _, _, data in valid],
+            batch_size=BATCH_SIZE)
+        _link([(recipe.id, link) for recipe, link in zip(recipes, links)])
+        Recipe.objects.filter(
+            id__in=[recipe.id for recipe in recipes]).update_search_vector()
+
+    done = {index: recipe.id for (index, _, _), recipe in zip(valid, recipes)}
+    return _results(len(items), done, errors)
+
+
+def bulk_update_recipes(user, items):
+    """Partially update the valid recipes of the items in one transaction"""
+    ids = [item.get('id') for item in items if isinstance(item, dict)]
+    instances = Recipe.objects.filter(
+        user=user, id__in=[i for i in ids if is_id(i)]).in_bulk()
+    valid, errors = _validate(user, items, instances)
+
+    with transaction.atomic():
+        relinked = []
+        for _, recipe, data in valid:
+            link = {field: data.pop(field)
+                    for field in LINK_FIELDS if field in data}
+            Recipe.objects.filter(id=recipe.id).update(
+                version=F('version') + 1, **data)
+            if link:
+                relinked.append((recipe.id, link))
+
+        for field in LINK_FIELDS:
+            Recipe.objects.filter(id__in=[
+                recipe_id for recipe_id, link in relinked if field in link
+            ]).remove_links(field)
+        _link(relinked)
+        Recipe.objects.filter(
+            id__in=[recipe.id for _, recipe, _ in valid]
+        ).update_search_vector()
+
+    done = {index: recipe.id for index, recipe, _ in valid}
+    return _results(len(items), done, errors)
+
+
+def bulk_delete_recipes(user, ids):
+    """Delete the recipes of the user with the given ids"""
+    recipes = Recipe.objects.filter(user=user, id__in=ids)
+    with transaction.atomic():
+        # one grouped update per field instead of two per recipe
+        for field in LINK_FIELDS:
+            recipes.remove_links(field)
+        with recipes_uncounted():
+            _, deleted = recipes.delete()
+    return deleted.get(Recipe._meta.label, 0)
@@ -0,0 +1,35 @@
+from itertools import islice
+from django.db.models import Prefetch, prefetch_related_objects
+from rest_framework.utils.encoders import JSONEncoder
+from core.models import Tag, Ingredient
+from recipe.serializers import RecipeDetailSerializer
+
+
+def iter_chunks(iterable, size):
+    """Yield lists of at most size items of the iterable"""
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def export_recipes(queryset, chunk_size=1000):
+    """Yield the recipes as NDJSON lines, with their tags and ingredients
+
+    The recipes are read through a server side cursor and the related
+    objects are prefetched one chunk at a time, so the memory used does
+    not depend on the number of recipes.
+    """
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    recipes = queryset.order_by('id').iterator(chunk_size=chunk_size)
+    for chunk in iter_chunks(recipes, chunk_size):
+        prefetch_related_objects(
+            chunk,
+            Prefetch('ingredients',
+                     queryset=Ingredient.objects.only('id', 'name')),
+            Prefetch('tags', queryset=Tag.objects.only('id', 'name')),
+        )
+        for recipe in chunk:
+            data = RecipeDetailSerializer(recipe).data
+            yield (encoder.encode(data) + '\n').encode('utf-8')
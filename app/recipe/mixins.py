@@ -0,0 +1,64 @@
+import hashlib
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+from core.cache import get_response_cache, response_cache_key
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The resource has been modified.'
+    default_code = 'precondition_failed'
+
+
+class CachedListMixin:
+    """Serve the list action from the response cache
+
+    The cached responses of a user are invalidated by bumping the data
+    version of the user after every write.
+    """
+
+    def list(self, request, *args, **kwargs):
+        cache = get_response_cache()
+        key = response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data)
+        return response
+
+
+class ETagMixin:
+    """Answer conditional requests from version numbers
+
+    The ETags are computed from the data version of the user or of the
+    object, so a 304 is returned before the serializers run.
+    """
+    etag = None
+
+    def list(self, request, *args, **kwargs):
+        key = response_cache_key(request).encode('utf-8')
+        self.etag = quote_etag(hashlib.md5(key).hexdigest())
+        response = get_conditional_response(request, etag=self.etag)
+        if response is not None:
+            return response
+        return super().list(request, *args, **kwargs)
+
+    def check_if_match(self, etag):
+        """Raise if the client copy of the object is not the current one"""
+        etags = parse_etags(self.request.META.get('HTTP_IF_MATCH', ''))
+        if etags and etags != ['*'] and etag not in etags:
+            raise PreconditionFailed()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        if self.etag and (status.is_success(response.status_code) or
+                          response.status_code == 304):
+            response['ETag'] = self.etag
+        return response
@@ -0,0 +1,145 @@
+import base64
+import json
+from collections import OrderedDict
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Paginate on the view ordering using an opaque cursor
+
+    The cursor stores the ordering values of the last row returned, so the
+    next page is a range filter on an index instead of an OFFSET. The
+    ordering has to end with a unique column (the id) to break ties.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    ordering = ('-id',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(view)
+        position, reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [self._invert(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self._after(ordering, position))
+            except (ValueError, TypeError, DjangoValidationError):
+                # the values do not match the types of the ordering fields
+                raise NotFound(self.invalid_cursor_message)
+
+        # fetch one extra row to know whether there is another page
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        if results:
+            self.next_position = self._position(results[-1])
+            self.previous_position = self._position(results[0])
+        else:
+            # an empty page still links back to where the client was
+            self.next_position = self.previous_position = position
+
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        """Return the page size requested by the client, within bounds"""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, view):
+        """Return the ordering declared by the view"""
+        if hasattr(view, 'get_ordering'):
+            return tuple(view.get_ordering())
+        return tuple(getattr(view, 'ordering', self.ordering))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def decode_cursor(self, request):
+        """Return the position and direction stored in the cursor"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            cursor = json.loads(
+                base64.urlsafe_b64decode(encoded.encode('ascii')))
+            position = cursor['p']
+            reverse = bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or \
+                len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse):
+        """Return the url of the page next to the position"""
+        cursor = {'p': position}
+        if reverse:
+            cursor['r'] = 1
+        data = json.dumps(cursor, cls=DjangoJSONEncoder,
+                          separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(data.encode('utf-8'))
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def _position(self, obj):
+        """Return the ordering values of an object"""
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def _invert(self, field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    def _after(self, ordering, position):
+        """Build the filter matching the rows sorted after the position
+
+        For an ordering (a, b) this is: a > x OR (a = x AND b > y), with the
+        comparison flipped for descending columns.
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
@@ -1,5 +1,7 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
 from rest_framework import serializers
-from core.models import Tag, Ingredient, Recipe
+from core.models import Tag, Ingredient, Recipe, ImageUpload
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -7,8 +9,8 @@ class TagSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Tag
-        fields = ('id', 'name')
-        read_only_fields = ('id',)
+        fields = ('id', 'name', 'recipe_count')
+        read_only_fields = ('id', 'recipe_count')
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -16,8 +18,54 @@ class IngredientSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Ingredient
+        fields = ('id', 'name', 'recipe_count')
+        read_only_fields = ('id', 'recipe_count')
+
+
+class RecipeTagSerializer(TagSerializer):
+    """Serializer for the tags nested in a recipe"""
+
+    class Meta(TagSerializer.Meta):
+        # the count changes with other recipes, not with the recipe ETag
         fields = ('id', 'name')
-        read_only_fields = ('id',)
+
+
+class RecipeIngredientSerializer(IngredientSerializer):
+    """Serializer for the ingredients nested in a recipe"""
+
+    class Meta(IngredientSerializer.Meta):
+        fields = ('id', 'name')
+
+
+class NameListSerializer(serializers.Serializer):
+    """Serializer for a list of tag or ingredient names"""
+    names = serializers.ListField(
+        child=serializers.CharField(), allow_empty=False)
+
+    def validate_names(self, value):
+        max_length = self.context['max_length']
+        too_long = [name for name in value if len(name) > max_length]
+        if too_long:
+            raise serializers.ValidationError(
+                f'Ensure "{too_long[0]}" has no more than {max_length} '
+                f'characters.')
+        return value
+
+
+class ImageVariantsField(serializers.Field):
+    """Read only field with the url of each resized image"""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        urls = {}
+        for variant, name in value.items():
+            url = default_storage.url(name)
+            urls[variant] = request.build_absolute_uri(url) if request else url
+        return urls
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -33,24 +81,69 @@ class RecipeSerializer(serializers.ModelSerializer):
         many=True,
         queryset=Tag.objects.all()
     )
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'title', 'ingredients', 'tags',
-                  'time_minutes', 'price', 'link')
+                  'time_minutes', 'price', 'link', 'image_variants')
         read_only_fields = ('id',)
 
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serialize a recipe detail"""
 
-    ingredients = IngredientSerializer(many=True, read_only=True)
-    tags = TagSerializer(many=True, read_only=True)
+    ingredients = RecipeIngredientSerializer(many=True, read_only=True)
+    tags = RecipeTagSerializer(many=True, read_only=True)
+
+
+class RecipeBulkSerializer(RecipeSerializer):
+    """Validate a recipe of a bulk request
+
+    The ids of the tags and ingredients of the user are passed in the
+    context, so the related ids are checked without a query per item.
+    """
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(), required=False)
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), required=False)
+
+    def _validate_ids(self, value, known_ids):
+        unknown = set(value) - known_ids
+        if unknown:
+            raise serializers.ValidationError(
+                f'Invalid pk "{min(unknown)}" - object does not exist.')
+        return value
+
+    def validate_ingredients(self, value):
+        return self._validate_ids(value, self.context['ingredient_ids'])
+
+    def validate_tags(self, value):
+        return self._validate_ids(value, self.context['tag_ids'])
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images"""
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'image')
+        fields = ('id', 'image', 'image_variants')
         read_only_fields = ('id',)
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """Serializer for resumable image upload sessions"""
+
+    class Meta:
+        model = ImageUpload
+        fields = ('id', 'filename', 'size', 'offset')
+        read_only_fields = ('id', 'offset')
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.IMAGE_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Ensure this value is between 1 and '
+                f'{settings.IMAGE_UPLOAD_MAX_SIZE}.')
+        return value
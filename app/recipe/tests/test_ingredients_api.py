@@ -45,7 +45,7 @@ class PrivateIngredientsApiTests(TestCase):
         ingredients = Ingredient.objects.all().order_by('-name')
         serializer = IngredientSerializer(ingredients, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingredients_limited_to_user(self):
         """test that ingredients for the authenticated user are returned"""
@@ -55,8 +55,8 @@ class PrivateIngredientsApiTests(TestCase):
         res = self.client.get(INGREDIENTS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], ingredient.name)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], ingredient.name)
 
     def test_create_ingredient_ok(self):
         """Test create a new ingredient"""
@@ -89,13 +89,14 @@ class PrivateIngredientsApiTests(TestCase):
             user=self.user
         )
         recipe1.ingredients.add(ingred1)
+        ingred1.refresh_from_db()
 
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
         ser1 = IngredientSerializer(ingred1)
         ser2 = IngredientSerializer(ingred2)
-        self.assertIn(ser1.data, res.data)
-        self.assertNotIn(ser2.data, res.data)
+        self.assertIn(ser1.data, res.data['results'])
+        self.assertNotIn(ser2.data, res.data['results'])
 
     def test_retrieve_ingredient_assigned_unique(self):
         """ Test filtering ingredients by assigned returns unique items"""
@@ -116,4 +117,4 @@ class PrivateIngredientsApiTests(TestCase):
         )
         recipe2.ingredients.add(ingredient1)
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
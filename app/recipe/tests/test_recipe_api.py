@@ -1,17 +1,25 @@
 # create temporary files
+import fcntl
+import json
 import tempfile
 import os
+from unittest.mock import patch
 from PIL import Image
 from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
 from rest_framework import status
 from rest_framework.test import APIClient
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
-from core.models import Recipe, Tag, Ingredient
+from core.models import Recipe, Tag, Ingredient, ImageUpload
+from core.testing import QueryBudgetMixin
 
 
 RECIPES_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+EXPORT_URL = reverse('recipe:recipe-export')
 
 
 def image_upload_url(recipe_id):
@@ -32,6 +40,11 @@ def sample_ingredient(user, name='cinamon'):
     return Ingredient.objects.create(user=user, name=name)
 
 
+def image_uploads_url(recipe_id):
+    """Return URL starting a resumable image upload"""
+    return reverse('recipe:recipe-start-image-upload', args=[recipe_id])
+
+
 def detail_url(recipe_id):
     return reverse('recipe:recipe-detail', args=[recipe_id])
 
@@ -60,7 +73,7 @@ class PublicRecipeApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateRecipeApiTests(TestCase):
+class PrivateRecipeApiTests(QueryBudgetMixin, TestCase):
     """Test autenticated recipe api """
 
     def setUp(self):
@@ -76,7 +89,7 @@ class PrivateRecipeApiTests(TestCase):
         recipes = Recipe.objects.all().order_by('-id')
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipes_limited_to_user(self):
         user2 = sample_user('other@app.dev.comm', 'password123')
@@ -88,8 +101,8 @@ class PrivateRecipeApiTests(TestCase):
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_view_recipe_detail(self):
         """Test for recipe detail"""
@@ -103,6 +116,52 @@ class PrivateRecipeApiTests(TestCase):
         serializer = RecipeDetailSerializer(recipe)
         self.assertEqual(res.data, serializer.data)
 
+    def test_list_recipes_query_count_is_constant(self):
+        """Test listing recipes does not issue a query per recipe"""
+        tag = sample_tag(user=self.user)
+        ingredient = sample_ingredient(user=self.user)
+        for i in range(10):
+            recipe = sample_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+        # recipes, ingredients and tags
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 10)
+        self.assertEqual(res.data['results'][0]['tags'], [tag.id])
+        self.assertEqual(
+            res.data['results'][0]['ingredients'], [ingredient.id])
+
+    def test_retrieve_recipes_paginated(self):
+        """Test recipes are paginated newest first with a cursor"""
+        recipes = [sample_recipe(user=self.user, title=f'Recipe {i}')
+                   for i in range(5)]
+
+        res = self.client.get(RECIPES_URL, {'page_size': 3})
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(len(ids), 3)
+        res = self.client.get(res.data['next'])
+        ids += [recipe['id'] for recipe in res.data['results']]
+
+        self.assertIsNone(res.data['next'])
+        self.assertEqual(ids, [recipe.id for recipe in reversed(recipes)])
+
+    def test_view_recipe_detail_query_count(self):
+        """Test the recipe detail prefetches its nested objects"""
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(sample_tag(user=self.user, name='Vegan'))
+        recipe.tags.add(sample_tag(user=self.user, name='Dessert'))
+        recipe.ingredients.add(sample_ingredient(user=self.user))
+
+        with self.assertNumQueries(3):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(len(res.data['tags']), 2)
+        self.assertEqual(len(res.data['ingredients']), 1)
+
     def test_create_basic_recipe(self):
         """Create a basic recipe"""
         payload = {
@@ -189,6 +248,357 @@ class PrivateRecipeApiTests(TestCase):
         tags = recipe.tags.all()
         self.assertEqual(len(tags), 0)
 
+    def test_filter_recipes_by_tags_unique(self):
+        """Test recipes matching several tags are returned once"""
+        recipe = sample_recipe(user=self.user)
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Dessert')
+        recipe.tags.add(tag1, tag2)
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_filter_recipes_match_all(self):
+        """Test match=all returns recipes having every tag and ingredient"""
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Dessert')
+        ingredient = sample_ingredient(user=self.user, name='Lime')
+        recipe1 = sample_recipe(user=self.user, title='Lime sorbet')
+        recipe1.tags.add(tag1, tag2)
+        recipe1.ingredients.add(ingredient)
+        recipe2 = sample_recipe(user=self.user, title='Vegan curry')
+        recipe2.tags.add(tag1)
+        recipe2.ingredients.add(ingredient)
+        recipe3 = sample_recipe(user=self.user, title='Apple pie')
+        recipe3.tags.add(tag1, tag2)
+
+        res = self.client.get(RECIPES_URL, {
+            'tags': f'{tag1.id},{tag2.id}',
+            'ingredients': f'{ingredient.id}',
+            'match': 'all',
+        })
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [recipe1.id])
+
+    def test_filter_recipes_invalid_match(self):
+        """Test an unknown match mode is rejected"""
+        res = self.client.get(RECIPES_URL, {'tags': '1', 'match': 'some'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_recipes_by_title_prefix(self):
+        """Test searching recipes by the start of a title word"""
+        recipe1 = sample_recipe(user=self.user, title='Chocolate cake')
+        sample_recipe(user=self.user, title='Fish and chips')
+
+        res = self.client.get(RECIPES_URL, {'q': 'choco'})
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [recipe1.id])
+
+    def test_search_recipes_ranks_title_first(self):
+        """Test title matches rank above tag and ingredient matches"""
+        recipe1 = sample_recipe(user=self.user, title='Vegetable soup')
+        recipe1.tags.add(sample_tag(user=self.user, name='Lemon'))
+        recipe2 = sample_recipe(user=self.user, title='Lemon tart')
+        recipe3 = sample_recipe(user=self.user, title='Fish')
+        recipe3.ingredients.add(
+            sample_ingredient(user=self.user, name='Lemon'))
+        sample_recipe(user=self.user, title='Porridge')
+
+        res = self.client.get(RECIPES_URL, {'q': 'lemon'})
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids[0], recipe2.id)
+        self.assertCountEqual(ids, [recipe1.id, recipe2.id, recipe3.id])
+
+    def test_search_recipes_after_tag_rename(self):
+        """Test the search index follows renamed tags"""
+        tag = sample_tag(user=self.user, name='Italian')
+        recipe = sample_recipe(user=self.user, title='Carbonara')
+        recipe.tags.add(tag)
+        tag.name = 'Roman'
+        tag.save()
+
+        res = self.client.get(RECIPES_URL, {'q': 'roman'})
+        self.assertEqual(len(res.data['results']), 1)
+        res = self.client.get(RECIPES_URL, {'q': 'italian'})
+        self.assertEqual(len(res.data['results']), 0)
+
+    def test_search_recipes_without_words(self):
+        """Test a search with only punctuation matches no recipes"""
+        sample_recipe(user=self.user, title='Pasta')
+
+        res = self.client.get(RECIPES_URL, {'q': '!!!'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [])
+
+    def test_search_recipes_paginated_by_rank(self):
+        """Test search results can be paged through"""
+        for i in range(3):
+            sample_recipe(user=self.user, title=f'Pasta {i}')
+        sample_recipe(user=self.user, title='Pasta pasta')
+
+        res = self.client.get(RECIPES_URL, {'q': 'pasta', 'page_size': 2})
+        ids = [recipe['id'] for recipe in res.data['results']]
+        res = self.client.get(res.data['next'])
+        ids += [recipe['id'] for recipe in res.data['results']]
+
+        self.assertIsNone(res.data['next'])
+        self.assertEqual(len(set(ids)), 4)
+
+    def test_update_recipe_invalidates_cache(self):
+        """Test the recipe list reflects an update made after caching it"""
+        recipe = sample_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        self.client.patch(detail_url(recipe.id), {'title': 'Lasagne'})
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data['results'][0]['title'], 'Lasagne')
+
+    def test_delete_recipe_invalidates_cache(self):
+        """Test the recipe list reflects a deletion made after caching it"""
+        recipe = sample_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        self.client.delete(detail_url(recipe.id))
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data['results'], [])
+
+    def test_list_recipes_not_modified(self):
+        """Test listing recipes with a current ETag returns 304"""
+        sample_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+        etag = res['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_list_recipes_etag_changes_on_write(self):
+        """Test creating a recipe changes the ETag of the list"""
+        res = self.client.get(RECIPES_URL)
+        etag = res['ETag']
+        sample_recipe(user=self.user)
+        self.client.post(RECIPES_URL, {
+            'title': 'Pancakes', 'time_minutes': 10, 'price': 2.00
+        })
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_view_recipe_detail_not_modified(self):
+        """Test retrieving a recipe with a current ETag returns 304"""
+        recipe = sample_recipe(user=self.user)
+        res = self.client.get(detail_url(recipe.id))
+        etag = res['ETag']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(
+                detail_url(recipe.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_update_recipe_if_match(self):
+        """Test updating a recipe with the current ETag"""
+        recipe = sample_recipe(user=self.user)
+        etag = self.client.get(detail_url(recipe.id))['ETag']
+
+        res = self.client.patch(
+            detail_url(recipe.id), {'title': 'Lasagne'}, HTTP_IF_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(
+            res['ETag'], self.client.get(detail_url(recipe.id))['ETag'])
+
+    def test_update_recipe_stale_if_match(self):
+        """Test updating a recipe with an outdated ETag is refused"""
+        recipe = sample_recipe(user=self.user)
+        etag = self.client.get(detail_url(recipe.id))['ETag']
+        self.client.patch(detail_url(recipe.id), {'title': 'Lasagne'})
+
+        res = self.client.patch(
+            detail_url(recipe.id), {'title': 'Pizza'}, HTTP_IF_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Lasagne')
+
+    def test_bulk_create_recipes(self):
+        """Test creating many recipes with their tags and ingredients"""
+        tag = sample_tag(user=self.user)
+        ingredient = sample_ingredient(user=self.user)
+        payload = [
+            {'title': f'Recipe {i}', 'time_minutes': 10, 'price': '5.00',
+             'tags': [tag.id], 'ingredients': [ingredient.id]}
+            for i in range(20)
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data['results']), 20)
+        recipes = Recipe.objects.filter(user=self.user, tags=tag)
+        self.assertEqual(recipes.count(), 20)
+        self.assertEqual(
+            Recipe.objects.filter(ingredients=ingredient).count(), 20)
+        res = self.client.get(RECIPES_URL, {'q': 'recipe'})
+        self.assertEqual(len(res.data['results']), 20)
+
+    def test_bulk_create_recipes_partial_errors(self):
+        """Test invalid items are reported without aborting the batch"""
+        user2 = sample_user('other@app.dev.comm', 'password123')
+        other_tag = sample_tag(user=user2)
+        payload = [
+            {'title': 'Valid', 'time_minutes': 10, 'price': '5.00'},
+            {'title': 'No time', 'price': '5.00'},
+            {'title': 'Foreign tag', 'time_minutes': 10, 'price': '5.00',
+             'tags': [other_tag.id]},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        results = res.data['results']
+        self.assertIn('id', results[0])
+        self.assertIn('time_minutes', results[1]['errors'])
+        self.assertIn('tags', results[2]['errors'])
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_update_recipes(self):
+        """Test updating many recipes at once"""
+        recipe1 = sample_recipe(user=self.user)
+        recipe1.tags.add(sample_tag(user=self.user))
+        recipe2 = sample_recipe(user=self.user)
+        new_tag = sample_tag(user=self.user, name='Curry')
+        payload = [
+            {'id': recipe1.id, 'tags': [new_tag.id]},
+            {'id': recipe2.id, 'title': 'Chicken tikka'},
+            {'id': 0, 'title': 'Missing'},
+        ]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('errors', res.data['results'][2])
+        self.assertEqual(list(recipe1.tags.all()), [new_tag])
+        recipe2.refresh_from_db()
+        self.assertEqual(recipe2.title, 'Chicken tikka')
+        self.assertEqual(recipe2.version, 1)
+
+    def test_bulk_update_recipes_invalid_ids(self):
+        """Test repeated and malformed ids are per-item errors"""
+        # true equals 1 in Python
+        recipe = sample_recipe(user=self.user, id=1)
+        tag = sample_tag(user=self.user)
+        payload = [
+            {'id': recipe.id, 'tags': [tag.id]},
+            {'id': recipe.id, 'tags': [tag.id]},
+            {'id': [recipe.id], 'title': 'List'},
+            {'id': {'pk': recipe.id}, 'title': 'Dict'},
+            {'id': True, 'title': 'Bool'},
+        ]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = res.data['results']
+        self.assertEqual(results[0], {'id': recipe.id})
+        for result in results[1:]:
+            self.assertIn('id', result['errors'])
+        self.assertEqual(results[4]['errors'], {'id': ['Recipe not found.']})
+        self.assertEqual(list(recipe.tags.all()), [tag])
+
+    def test_bulk_delete_recipes(self):
+        """Test deleting many recipes of the user only"""
+        recipe1 = sample_recipe(user=self.user)
+        recipe2 = sample_recipe(user=self.user)
+        other = sample_recipe(user=sample_user('other@app.dev.comm', 'pw'))
+
+        res = self.client.delete(
+            BULK_URL, {'ids': [recipe1.id, recipe2.id, other.id]},
+            format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['deleted'], 2)
+        self.assertTrue(Recipe.objects.filter(id=other.id).exists())
+
+    def test_bulk_delete_recipes_bool_ids(self):
+        """Test booleans are not accepted as recipe ids"""
+        # true equals 1 in Python
+        recipe = sample_recipe(user=self.user, id=1)
+
+        res = self.client.delete(BULK_URL, {'ids': [True]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Recipe.objects.filter(id=recipe.id).exists())
+
+    def test_bulk_delete_recipes_uncounted_at_once(self):
+        """Test the deleted recipes are uncounted without a query each"""
+        tag = sample_tag(user=self.user)
+        ingredient = sample_ingredient(user=self.user)
+        recipes = [sample_recipe(user=self.user) for _ in range(13)]
+        for recipe in recipes:
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+        queries = []
+        for batch in (recipes[1:3], recipes[3:]):
+            with CaptureQueriesContext(connection) as captured:
+                res = self.client.delete(
+                    BULK_URL, {'ids': [recipe.id for recipe in batch]},
+                    format='json')
+            self.assertEqual(res.data['deleted'], len(batch))
+            queries.append(len(captured))
+
+        self.assertEqual(queries[0], queries[1])
+        tag.refresh_from_db()
+        ingredient.refresh_from_db()
+        self.assertEqual((tag.recipe_count, ingredient.recipe_count), (1, 1))
+
+    def test_export_recipes(self):
+        """Test exporting the recipes of the user as NDJSON"""
+        tag = sample_tag(user=self.user)
+        ingredient = sample_ingredient(user=self.user)
+        for i in range(3):
+            recipe = sample_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+        sample_recipe(user=sample_user('other@app.dev.comm', 'pw'))
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        content = b''.join(res.streaming_content).decode('utf-8')
+        lines = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([line['title'] for line in lines],
+                         ['Recipe 0', 'Recipe 1', 'Recipe 2'])
+        self.assertEqual(lines[0]['tags'], [{'id': tag.id, 'name': tag.name}])
+        self.assertEqual(lines[0]['ingredients'][0]['name'], ingredient.name)
+
+    def test_list_recipes_query_budget(self):
+        """Test the queries of a recipe page do not grow with its size"""
+        for i in range(20):
+            recipe = sample_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(sample_tag(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(
+                sample_ingredient(user=self.user, name=f'Ingredient {i}'))
+
+        with self.assertMaxQueries(3):
+            self.client.get(RECIPES_URL)
+        with self.assertMaxQueries(3):
+            self.client.get(RECIPES_URL, {'q': 'recipe', 'match': 'all'})
+
 
 class RecipeImageUploadTests(TestCase):
 
@@ -244,9 +654,9 @@ class RecipeImageUploadTests(TestCase):
         ser1 = RecipeSerializer(recipe1)
         ser2 = RecipeSerializer(recipe2)
         ser3 = RecipeSerializer(recipe3)
-        self.assertIn(ser1.data, res.data)
-        self.assertIn(ser2.data, res.data)
-        self.assertNotIn(ser3.data, res.data)
+        self.assertIn(ser1.data, res.data['results'])
+        self.assertIn(ser2.data, res.data['results'])
+        self.assertNotIn(ser3.data, res.data['results'])
 
     def test_filter_recipes_by_ingredients(self):
         """Test returning recipes with specific ingredients"""
@@ -268,6 +678,214 @@ class RecipeImageUploadTests(TestCase):
         serializer2 = RecipeSerializer(recipe2)
         serializer3 = RecipeSerializer(recipe3)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertIn(serializer2.data, res.data['results'])
+        self.assertNotIn(serializer3.data, res.data['results'])
+
+
+class RecipeImageVariantTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings = override_settings(
+            MEDIA_ROOT=self.media_root.name, IMAGE_VARIANT_WORKERS=0)
+        self.settings.enable()
+        self.client = APIClient()
+        self.user = sample_user()
+        self.client.force_authenticate(self.user)
+        self.recipe = sample_recipe(user=self.user)
+
+    def tearDown(self):
+        self.settings.disable()
+        self.media_root.cleanup()
+
+    def test_upload_image_builds_variants(self):
+        """Test uploading an image exposes its resized variants"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (1000, 800)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('thumbnail', res.data['image_variants'])
+        self.recipe.refresh_from_db()
+        path = os.path.join(self.media_root.name,
+                            self.recipe.image_variants['thumbnail'])
+        with Image.open(path) as image:
+            self.assertEqual(image.size, (150, 120))
+
+        res = self.client.get(RECIPES_URL)
+        self.assertTrue(res.data['results'][0]['image_variants']['medium']
+                        .startswith('http://testserver/media/'))
+
+    def test_upload_no_image(self):
+        """Test uploading no image clears it without building variants"""
+        url = image_upload_url(self.recipe.id)
+
+        res = self.client.post(url, {}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['image_variants'], {})
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+
+class ResumableUploadMixin:
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.upload_dir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(
+            MEDIA_ROOT=self.media_root.name,
+            IMAGE_UPLOAD_DIR=self.upload_dir.name,
+            IMAGE_VARIANT_WORKERS=0)
+        self.settings.enable()
+        self.client = APIClient()
+        self.user = sample_user()
+        self.client.force_authenticate(self.user)
+        self.recipe = sample_recipe(user=self.user)
+        with tempfile.TemporaryFile() as f:
+            Image.new('RGB', (64, 48)).save(f, format='JPEG')
+            f.seek(0)
+            self.content = f.read()
+
+    def tearDown(self):
+        self.settings.disable()
+        self.media_root.cleanup()
+        self.upload_dir.cleanup()
+
+    def start(self, size=None):
+        res = self.client.post(image_uploads_url(self.recipe.id), {
+            'filename': 'photo.jpg',
+            'size': len(self.content) if size is None else size,
+        })
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return f'{image_uploads_url(self.recipe.id)}{res.data["id"]}/'
+
+    def put(self, url, first, last):
+        return self.client.generic(
+            'PUT', url, self.content[first:last + 1],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {first}-{last}/{len(self.content)}')
+
+
+class ResumableImageUploadTests(ResumableUploadMixin, TestCase):
+
+    def test_chunked_upload(self):
+        """Test uploading an image in byte ranges and finishing it"""
+        url = self.start()
+        middle = len(self.content) // 2
+        last = len(self.content) - 1
+
+        res = self.put(url, 0, middle - 1)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['offset'], middle)
+        res = self.put(url, middle, last)
+        self.assertEqual(res.data['offset'], len(self.content))
+
+        res = self.client.post(f'{url}finish/')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('thumbnail', res.data['image_variants'])
+        self.recipe.refresh_from_db()
+        with open(self.recipe.image.path, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertEqual(os.listdir(self.upload_dir.name), [])
+
+    def test_resume_from_offset(self):
+        """Test a range not starting at the offset is rejected"""
+        url = self.start()
+        self.put(url, 0, 9)
+
+        res = self.put(url, 20, 29)
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data['offset'], 10)
+
+        res = self.client.get(url)
+        self.assertEqual(res.data['offset'], 10)
+
+    def test_concurrent_append_rejected(self):
+        """Test a range is rejected while another request is appending"""
+        url = self.start()
+        upload = ImageUpload.objects.get()
+        with open(upload.path, 'rb') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            res = self.put(url, 0, 9)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data['offset'], 0)
+        res = self.put(url, 0, 9)
+        self.assertEqual(res.data['offset'], 10)
+
+    def test_invalid_range(self):
+        """Test a range outside of the declared size is rejected"""
+        url = self.start()
+        res = self.client.generic(
+            'PUT', url, b'x', HTTP_CONTENT_RANGE='bytes 0-0/1')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.generic('PUT', url, b'x')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_finish_incomplete_upload(self):
+        """Test an upload can only be finished once complete"""
+        url = self.start()
+        self.put(url, 0, 9)
+
+        res = self.client.post(f'{url}finish/')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_finish_invalid_image(self):
+        """Test the uploaded bytes must be an image"""
+        self.content = b'notimage' * 100
+        url = self.start()
+        self.put(url, 0, len(self.content) - 1)
+
+        res = self.client.post(f'{url}finish/')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(os.listdir(self.upload_dir.name), [])
+
+    def test_upload_size_limit(self):
+        """Test uploads larger than the limit are refused"""
+        with override_settings(IMAGE_UPLOAD_MAX_SIZE=10):
+            res = self.client.post(image_uploads_url(self.recipe.id), {
+                'filename': 'photo.jpg', 'size': 11})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_of_other_user(self):
+        """Test the uploads of other users are not found"""
+        url = self.start()
+        self.client.force_authenticate(sample_user(email='other@x.com'))
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ResumableImageUploadConnectionTests(ResumableUploadMixin,
+                                          TransactionTestCase):
+    """Append ranges outside of a transaction, as the requests do"""
+
+    def append(self):
+        url = self.start()
+        connection.ensure_connection()
+        before = connection.connection
+        res = self.put(url, 0, 9)
+        self.assertEqual(res.data['offset'], 10)
+        return before
+
+    def test_persistent_connection_kept(self):
+        """Test appending keeps the persistent connection"""
+        before = self.append()
+
+        self.assertIs(connection.connection, before)
+
+    def test_pooled_connection_released(self):
+        """Test appending gives a pooled connection back for the transfer"""
+        with patch('recipe.uploads.PooledDatabaseWrapper',
+                   type(connections['default'])):
+            before = self.append()
+
+        self.assertIsNot(connection.connection, before)
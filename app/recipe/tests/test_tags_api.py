@@ -1,3 +1,5 @@
+import base64
+import json
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import TestCase
@@ -43,7 +45,7 @@ class PrivateTagsApiTest(TestCase):
         tags = Tag.objects.all().order_by('-name')
         serializer = TagSerializer(tags, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_retrieve_user_tags(self):
         """Test that tags returned are for the authenticated user"""
@@ -53,8 +55,8 @@ class PrivateTagsApiTest(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
 
     def test_create_tag_successfull(self):
         """Test creating a new tag"""
@@ -86,12 +88,13 @@ class PrivateTagsApiTest(TestCase):
             user=self.user
         )
         recipe.tags.add(tag1)
+        tag1.refresh_from_db()
         # assigned only : filter by the assigned tags
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
         ser1 = TagSerializer(tag1)
         ser2 = TagSerializer(tag2)
-        self.assertIn(ser1.data, res.data)
-        self.assertNotIn(ser2.data, res.data)
+        self.assertIn(ser1.data, res.data['results'])
+        self.assertNotIn(ser2.data, res.data['results'])
 
     def test_retrieve_tags_assigned_unique(self):
         """Test filtering tags by assigned returns unique"""
@@ -112,4 +115,111 @@ class PrivateTagsApiTest(TestCase):
         )
         recipe2.tags.add(tag)
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_retrieve_tags_paginated(self):
+        """Test tags are paginated by name with a cursor"""
+        for name in ('Vegan', 'Dessert', 'Brunch', 'Asian', 'Apple'):
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.data['previous'])
+        names = [tag['name'] for tag in res.data['results']]
+        ids = [tag['id'] for tag in res.data['results']]
+
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            names += [tag['name'] for tag in res.data['results']]
+            ids += [tag['id'] for tag in res.data['results']]
+
+        self.assertEqual(
+            names, ['Vegan', 'Dessert', 'Brunch', 'Asian', 'Apple'])
+        self.assertEqual(len(set(ids)), 5)
+
+    def test_tags_pages_stable_under_inserts(self):
+        """Test new tags do not shift the following pages"""
+        for name in ('Dessert', 'Brunch', 'Asian'):
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'page_size': 1})
+        Tag.objects.create(user=self.user, name='Vegan')
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual(res.data['results'][0]['name'], 'Brunch')
+
+    def test_tags_previous_page(self):
+        """Test following the previous link returns the earlier page"""
+        for name in ('Dessert', 'Brunch', 'Asian'):
+            Tag.objects.create(user=self.user, name=name)
+
+        first = self.client.get(TAGS_URL, {'page_size': 2})
+        second = self.client.get(first.data['next'])
+        res = self.client.get(second.data['previous'])
+
+        self.assertEqual(res.data['results'], first.data['results'])
+        self.assertIsNone(res.data['previous'])
+
+    def test_tags_invalid_cursor(self):
+        """Test an invalid cursor returns not found"""
+        res = self.client.get(TAGS_URL, {'cursor': 'invalid'})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        Tag.objects.create(user=self.user, name='Vegan')
+        for position in (['Vegan', 'x'], ['Vegan', [1]], ['Vegan', None]):
+            cursor = base64.urlsafe_b64encode(
+                json.dumps({'p': position}).encode('utf-8'))
+            res = self.client.get(TAGS_URL, {'cursor': cursor.decode()})
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_retrieve_tags_cached(self):
+        """Test listing tags twice is served from the cache"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        res1 = self.client.get(TAGS_URL)
+
+        with self.assertNumQueries(0):
+            res2 = self.client.get(TAGS_URL)
+
+        self.assertEqual(res1.data, res2.data)
+
+    def test_create_tag_invalidates_cache(self):
+        """Test creating a tag is visible in the next listing"""
+        self.client.get(TAGS_URL)
+        self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.data['results'][0]['name'], 'Vegan')
+
+    def test_create_tag_duplicate(self):
+        """Test creating a tag twice is refused"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_get_or_create_tags(self):
+        """Test resolving tag names to ids in one request"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        user2 = sample_user('tester02@londonapp.com', 'tester02_pass')
+        Tag.objects.create(user=user2, name='Dessert')
+        url = reverse('recipe:tag-bulk')
+
+        res = self.client.post(
+            url, {'names': ['Dessert', 'Vegan', 'Dessert']}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([t['name'] for t in res.data], ['Dessert', 'Vegan'])
+        self.assertEqual(res.data[1]['id'], tag.id)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+        res2 = self.client.post(url, {'names': ['Dessert']}, format='json')
+        self.assertEqual(res2.data[0]['id'], res.data[0]['id'])
+
+    def test_bulk_get_or_create_tags_invalid(self):
+        """Test an empty list of names is refused"""
+        url = reverse('recipe:tag-bulk')
+        res = self.client.post(url, {'names': []}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
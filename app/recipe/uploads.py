@@ -0,0 +1,103 @@
+import fcntl
+import os
+import re
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import connections, router
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from core.db.base import DatabaseWrapper as PooledDatabaseWrapper
+from core.models import ImageUpload
+
+
+# bytes read from the request and written to disk at a time
+CHUNK_SIZE = 64 * 1024
+# sessions older than this are removed when the user starts a new one
+EXPIRY = timedelta(days=1)
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class PartialUploadedFile(UploadedFile):
+    """The complete file of an upload, as it was written to disk
+
+    Having a temporary_file_path lets the image validation open the file
+    by path and the storage move it in place, instead of reading it into
+    memory.
+    """
+
+    def __init__(self, upload):
+        super().__init__(open(upload.path, 'rb'), upload.filename,
+                         size=upload.size)
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def start_upload(recipe, filename, size):
+    """Create an upload session and its empty partial file"""
+    ImageUpload.objects.filter(
+        recipe__user=recipe.user, created__lt=timezone.now() - EXPIRY
+    ).delete()
+    upload = ImageUpload.objects.create(
+        recipe=recipe, filename=filename, size=size)
+    os.makedirs(settings.IMAGE_UPLOAD_DIR, exist_ok=True)
+    open(upload.path, 'wb').close()
+    return upload
+
+
+def parse_content_range(upload, header):
+    """Return the first and last byte of a Content-Range header"""
+    match = CONTENT_RANGE.match(header or '')
+    if not match:
+        raise ValidationError(
+            {'Content-Range': ['Expected "bytes <first>-<last>/<size>".']})
+    first, last, size = (int(value) for value in match.groups())
+    if size != upload.size or first > last or last >= size:
+        raise ValidationError(
+            {'Content-Range': ['Invalid byte range for this upload.']})
+    return first, last
+
+
+def append_chunk(upload, first, stream, length):
+    """Append up to length bytes of the stream at the offset of the upload
+
+    The partial file is locked while the client sends the bytes, not the
+    upload row, so a slow client holds no database lock or pooled
+    connection.
+    The bytes are copied in small chunks and the offset moves by what was
+    written, so an interrupted request still counts what it delivered.
+    Return whether the range was appended: it must start at the offset,
+    with no other request appending.
+    """
+    with open(upload.path, 'r+b') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        # the offset may have moved before the file was locked
+        if not ImageUpload.objects.filter(
+                pk=upload.pk, offset=first).exists():
+            return False
+        connection = connections[router.db_for_write(ImageUpload)]
+        if isinstance(connection, PooledDatabaseWrapper) and \
+                not connection.in_atomic_block:
+            # the connection goes back to the pool during the transfer,
+            # a persistent connection is kept instead of reconnecting
+            connection.close()
+
+        # drop whatever an interrupted request left after the offset
+        f.truncate(first)
+        f.seek(first)
+        written = 0
+        while stream is not None and written < length:
+            data = stream.read(min(CHUNK_SIZE, length - written))
+            if not data:
+                break
+            f.write(data)
+            written += len(data)
+        f.flush()
+        return bool(ImageUpload.objects.filter(
+            pk=upload.pk, offset=first
+        ).update(offset=F('offset') + written))
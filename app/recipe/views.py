@@ -1,34 +1,74 @@
 #from django.shortcuts import render
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Prefetch
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
-from core.models import Tag, Ingredient, Recipe
-from recipe import serializers
-
-   class BaseRecipeAttrViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
-                                mixins.CreateModelMixin):
-        """Base viewset for user owned recipe attributes"""
-        authentication_classes = (TokenAuthentication,)
-        permission_classes = (IsAuthenticated,)
-
-        def get_queryset(self):
-            """Return objects for the current user only"""
-            # '0' -> 0 -> false
-            assigned_only = bool(
-                int(self.request.query_params.get('assigned_only', 0))
-            )
-            queryset = self.queryset
-            if assigned_only:
-                queryset = queryset.filter(recipe__isnull=False)
+from core.authentication import CachedTokenAuthentication
+from core.cache import bump_data_version
+from core.images import schedule_variants
+from core.throttling import ReadWriteThrottle
+from core.models import Tag, Ingredient, Recipe, ImageUpload
+from recipe import bulk, serializers, uploads
+from recipe.export import export_recipes
+from recipe.mixins import CachedListMixin, ETagMixin
+from recipe.pagination import KeysetPagination
+
+
+UPLOAD_ID = r'(?P<upload_id>[0-9a-f]{8}(?:-[0-9a-f]{4}){3}-[0-9a-f]{12})'
+
+
+class BaseRecipeAttrViewSet(ETagMixin, CachedListMixin,
+                            viewsets.GenericViewSet, mixins.ListModelMixin,
+                            mixins.CreateModelMixin):
+    """Base viewset for user owned recipe attributes"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    throttle_classes = (ReadWriteThrottle,)
+    pagination_class = KeysetPagination
+    ordering = ('-name', '-id')
 
-            return queryset.filter(
-                user=self.request.user).order_by('-name').distinct()
+    def get_queryset(self):
+        """Return objects for the current user only"""
+        # '0' -> 0 -> false
+        assigned_only = bool(
+            int(self.request.query_params.get('assigned_only', 0))
+        )
+        queryset = self.queryset
+        if assigned_only:
+            # counted by core.signals, no join with the recipes
+            queryset = queryset.filter(recipe_count__gt=0)
+
+        return queryset.filter(user=self.request.user).order_by('-name')
 
     def perform_create(self, serializer):
         """Create a new tag"""
-        serializer.save(user=self.request.user)
+        try:
+            with transaction.atomic():
+                serializer.save(user=self.request.user)
+        except IntegrityError:
+            raise ValidationError({'name': ['This name already exists.']})
+        bump_data_version(self.request.user)
+
+    @action(methods=['POST'], detail=False)
+    def bulk(self, request):
+        """Return the objects with the given names, creating missing ones"""
+        model = self.queryset.model
+        names = serializers.NameListSerializer(data=request.data, context={
+            'max_length': model._meta.get_field('name').max_length,
+        })
+        names.is_valid(raise_exception=True)
+        objects = model.objects.get_or_create_names(
+            request.user, names.validated_data['names'])
+        bump_data_version(request.user)
+        serializer = self.get_serializer(objects, many=True)
+        return Response(serializer.data)
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -45,12 +85,17 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     serializer_class = serializers.IngredientSerializer
 
 
-class RecipeVeiwSet(viewsets.ModelViewSet):
+class RecipeVeiwSet(ETagMixin, CachedListMixin, viewsets.ModelViewSet):
     """Manage recipes in the database"""
     serializer_class = serializers.RecipeSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    throttle_classes = (ReadWriteThrottle,)
+    pagination_class = KeysetPagination
+    ordering = ('-id',)
+    bulk_max_items = 10000
+    export_chunk_size = 1000
 
     def _params_to_ints(self, qs):
         """Convert a list of string ids to a list of integers"""
@@ -60,22 +105,69 @@ class RecipeVeiwSet(viewsets.ModelViewSet):
         """Retrieve the recipes for the authenticated user"""
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        search = self.request.query_params.get('q')
+        match = self.request.query_params.get('match', 'any')
+        if match not in ('any', 'all'):
+            raise ValidationError({'match': "Must be 'any' or 'all'."})
         queryset = self.queryset
         if tags:
             tag_ids = self._params_to_ints(tags)
-            #tags.id in tag_ids
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = queryset.filter(id__in=self._recipes_linked_to(
+                Recipe.tags.through, 'tag_id', tag_ids, match))
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = queryset.filter(id__in=self._recipes_linked_to(
+                Recipe.ingredients.through, 'ingredient_id', ingredient_ids,
+                match))
+        if search:
+            queryset = queryset.search(search)
+
+        queryset = queryset.prefetch_related(*self._get_prefetches())
+        return queryset.filter(user=self.request.user).order_by('-id')
+
+    def _recipes_linked_to(self, through, field, ids, match):
+        """Return a subquery of the recipe ids linked to the given objects
+
+        The through table is indexed by the tag (or ingredient) id, so it
+        acts as the inverted index: match 'all' keeps the recipes that
+        appear in the posting list of every requested id. Filtering with
+        a subquery instead of a join never duplicates recipes.
+        """
+        links = through.objects.filter(**{f'{field}__in': ids})
+        if match == 'all':
+            links = links.values('recipe_id').annotate(
+                matched=Count(field)).filter(matched=len(set(ids)))
+        return links.values('recipe_id')
+
+    def _get_prefetches(self):
+        """Return the related objects serialized by the current action"""
+        if self.action == 'list':
+            # the list serializer only renders the primary keys
+            return (
+                Prefetch('ingredients',
+                         queryset=Ingredient.objects.only('id')),
+                Prefetch('tags', queryset=Tag.objects.only('id')),
+            )
+        if self.action == 'retrieve':
+            # the detail serializer nests the full rows
+            return (
+                Prefetch('ingredients', queryset=Ingredient.objects.all()),
+                Prefetch('tags', queryset=Tag.objects.all()),
+            )
+        return ()
 
-        return queryset.filter(user=self.request.user)
+    def get_ordering(self):
+        """Return the ordering used to paginate the recipes"""
+        if self.request.query_params.get('q'):
+            # best matches first
+            return ('-rank', '-id')
+        return self.ordering
 
     def get_serializer_class(self):
         """Return appropiate serializer class"""
         if self.action == 'retrieve':
             return serializers.RecipeDetailSerializer
-        elif self.action == 'upload_image':
+        elif self.action in ('upload_image', 'finish_image_upload'):
             return serializers.RecipeImageSerializer
 
         return self.serializer_class
@@ -84,6 +176,45 @@ class RecipeVeiwSet(viewsets.ModelViewSet):
         """create a new recipe"""
         # the only thing we have to do is pass the user
         serializer.save(user=self.request.user)
+        bump_data_version(self.request.user)
+
+    def _recipe_etag(self, recipe_id, version):
+        return quote_etag(f'recipe-{recipe_id}-{version}')
+
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve a recipe, unless the client copy is current"""
+        recipe_id = kwargs['pk']
+        if request.META.get('HTTP_IF_NONE_MATCH') and recipe_id.isdigit():
+            # only the version is needed to answer with a 304
+            version = self.queryset.filter(
+                user=request.user, pk=recipe_id
+            ).values_list('version', flat=True).first()
+            if version is not None:
+                self.etag = self._recipe_etag(int(recipe_id), version)
+                response = get_conditional_response(request, etag=self.etag)
+                if response is not None:
+                    return response
+
+        recipe = self.get_object()
+        self.etag = self._recipe_etag(recipe.id, recipe.version)
+        serializer = self.get_serializer(recipe)
+        return Response(serializer.data)
+
+    def perform_update(self, serializer):
+        """Update a recipe, unless the client copy is out of date"""
+        recipe = serializer.instance
+        with transaction.atomic():
+            version = Recipe.objects.select_for_update().values_list(
+                'version', flat=True).get(pk=recipe.id)
+            self.check_if_match(self._recipe_etag(recipe.id, version))
+            serializer.save(version=version + 1)
+        self.etag = self._recipe_etag(recipe.id, recipe.version)
+        bump_data_version(self.request.user)
+
+    def perform_destroy(self, instance):
+        """Delete a recipe"""
+        instance.delete()
+        bump_data_version(self.request.user)
 
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
@@ -91,6 +222,119 @@ class RecipeVeiwSet(viewsets.ModelViewSet):
         recipe = self.get_object()
         serializer = self.get_serializer(recipe, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            self._save_image(serializer)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def _save_image(self, serializer):
+        """Save the new image of a recipe and build its variants"""
+        recipe = serializer.instance
+        # the variants of the previous image are outdated
+        serializer.save(image_variants={}, version=recipe.version + 1)
+        schedule_variants(recipe)
+        bump_data_version(self.request.user)
+
+    def _get_image_upload(self, upload_id):
+        recipe = self.get_object()
+        upload = get_object_or_404(ImageUpload, pk=upload_id, recipe=recipe)
+        upload.recipe = recipe
+        return upload
+
+    @action(methods=['POST'], detail=True, url_path='image-uploads')
+    def start_image_upload(self, request, pk=None):
+        """Start a resumable upload of the recipe image
+
+        The client then PUTs byte ranges of the file, with a Content-Range
+        header, and finishes the upload once every byte is received.
+        """
+        recipe = self.get_object()
+        serializer = serializers.ImageUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = uploads.start_upload(recipe, **serializer.validated_data)
+        return Response(serializers.ImageUploadSerializer(upload).data,
+                        status=status.HTTP_201_CREATED)
+
+    @action(methods=['GET', 'PUT'], detail=True,
+            url_path=f'image-uploads/{UPLOAD_ID}')
+    def image_upload(self, request, pk=None, upload_id=None):
+        """Return the offset of an upload or append a byte range to it"""
+        upload = self._get_image_upload(upload_id)
+        if request.method == 'PUT':
+            first, last = uploads.parse_content_range(
+                upload, request.META.get('HTTP_CONTENT_RANGE'))
+            # the body is streamed to disk, request.data is never read
+            appended = first == upload.offset and uploads.append_chunk(
+                upload, first, request.stream, last - first + 1)
+            upload.refresh_from_db(fields=['offset'])
+            if not appended:
+                # the client resumes from the offset in the response
+                return Response(
+                    serializers.ImageUploadSerializer(upload).data,
+                    status=status.HTTP_409_CONFLICT)
+        return Response(serializers.ImageUploadSerializer(upload).data)
+
+    @action(methods=['POST'], detail=True,
+            url_path=f'image-uploads/{UPLOAD_ID}/finish')
+    def finish_image_upload(self, request, pk=None, upload_id=None):
+        """Validate a complete upload and make it the recipe image"""
+        upload = self._get_image_upload(upload_id)
+        if upload.offset != upload.size:
+            raise ValidationError(
+                {'offset': ['The upload is not complete.']})
+        with uploads.PartialUploadedFile(upload) as image:
+            serializer = self.get_serializer(
+                upload.recipe, data={'image': image})
+            valid = serializer.is_valid()
+            if valid:
+                # the partial file is moved into the media storage
+                self._save_image(serializer)
+        upload.delete()
+        if valid:
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=['POST', 'PATCH', 'DELETE'], detail=False)
+    def bulk(self, request):
+        """Create, update or delete many recipes in one transaction
+
+        POST and PATCH take a list of recipes and answer with the id or
+        the validation errors of each item, DELETE takes a list of ids.
+        """
+        data = request.data
+        if request.method == 'DELETE':
+            ids = data.get('ids') if isinstance(data, dict) else None
+            if not isinstance(ids, list) or \
+                    not all(bulk.is_id(i) for i in ids):
+                return Response({'ids': ['Expected a list of ids.']},
+                                status=status.HTTP_400_BAD_REQUEST)
+            deleted = bulk.bulk_delete_recipes(request.user, ids)
+            bump_data_version(request.user)
+            return Response({'deleted': deleted})
+
+        if not isinstance(data, list):
+            return Response({'non_field_errors': ['Expected a list.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(data) > self.bulk_max_items:
+            return Response({'non_field_errors': [
+                f'At most {self.bulk_max_items} items are allowed.']},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        if request.method == 'POST':
+            results = bulk.bulk_create_recipes(request.user, data)
+            success = status.HTTP_201_CREATED
+        else:
+            results = bulk.bulk_update_recipes(request.user, data)
+            success = status.HTTP_200_OK
+        if any('id' in result for result in results):
+            bump_data_version(request.user)
+        elif results:
+            success = status.HTTP_400_BAD_REQUEST
+        return Response({'results': results}, status=success)
+
+    @action(methods=['GET'], detail=False)
+    def export(self, request):
+        """Stream all the recipes of the user as NDJSON"""
+        queryset = self.queryset.filter(user=request.user)
+        return StreamingHttpResponse(
+            export_recipes(queryset, self.export_chunk_size),
+            content_type='application/x-ndjson')
@@ -1,6 +1,9 @@
-from rest_framework import generics, authentication, permissions
+from django.conf import settings
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+from core.authentication import CachedTokenAuthentication
+from core.throttling import AuthThrottle, ConcurrencyLimit
 from user.serializers import UserSerializer, AuthTokenSerializer
 
 # Remember : view = api view
@@ -17,6 +20,14 @@ class CreateTokenView(ObtainAuthToken):
     """Create a new auth token for user"""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    throttle_classes = (AuthThrottle,)
+    # hashing a password takes tens of milliseconds of CPU, the checks
+    # over the limit are refused so a login flood leaves CPU for the API
+    password_checks = ConcurrencyLimit(settings.AUTH_MAX_CONCURRENCY)
+
+    def post(self, request, *args, **kwargs):
+        with self.password_checks:
+            return super().post(request, *args, **kwargs)
 
 # ----------------------------------------------------------------------
 # We define an API using a base class that can retrieve and update
@@ -27,7 +38,7 @@ class CreateTokenView(ObtainAuthToken):
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated users"""
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):